@@ -1,6 +1,10 @@
 import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
+from typing import Optional
+
+import jwt
 from fastapi import Depends, HTTPException, APIRouter
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from dotenv import load_dotenv
@@ -8,10 +12,12 @@ from dotenv import load_dotenv
 # Ensure environment variables are loaded
 load_dotenv()
 
-# This MUST match the SECRET_KEY in your main.py and .env exactly
+# Tokens are both signed and verified here, with the SECRET_KEY from .env
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+# Verified tokens remembered by verify_token, so polling routes skip the signature check
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 router = APIRouter()
@@ -22,15 +28,51 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def verify_token(token: str = Depends(oauth2_scheme)):
+class TokenCache:
+    """LRU of already-verified tokens -> (username, exp). An entry is never served past the token's exp.
+
+    Not thread-safe: use it from the event loop only (verify_token is async for that reason)."""
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self.hits = 0; self.misses = 0
+
+    def get(self, token: str) -> Optional[str]:
+        entry = self._entries.get(token)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None: del self._entries[token]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, token: str, username: str, exp: float):
+        self._entries[token] = (username, exp)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.maxsize: self._entries.popitem(last=False)
+
+    def stats(self) -> dict: return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+token_cache = TokenCache()
+
+# async so FastAPI calls it on the event loop instead of the threadpool: no thread hop per request,
+# and token_cache stays single-threaded. An HS256 check takes microseconds, so it does not block the loop
+async def verify_token(token: str = Depends(oauth2_scheme)):
+    username = token_cache.get(token)
+    if username is not None:
+        return username
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return username
-    except JWTError:
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    username = payload.get("sub")
+    if username is None:
         raise HTTPException(status_code=401, detail="Invalid token")
+    # Tokens without an exp are still accepted, just not cached
+    if isinstance(payload.get("exp"), (int, float)):
+        token_cache.put(token, username, payload["exp"])
+    return username
 
 @router.post("/login")
 def login(form_data: OAuth2PasswordRequestForm = Depends()):
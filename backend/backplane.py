@@ -0,0 +1,178 @@
+import os
+import uuid
+import asyncio
+from contextlib import suppress
+from typing import Awaitable, Callable, Iterable, Optional
+
+from serialization import dumps, loads
+from logs import get_logger
+
+# Select with WS_BACKPLANE=local|unix. "local" is enough for a single uvicorn worker;
+# "unix" is needed as soon as the app runs with --workers/-w > 1 on one host.
+WS_BACKPLANE = os.getenv("WS_BACKPLANE", "local")
+WS_BACKPLANE_PATH = os.getenv("WS_BACKPLANE_PATH", "/tmp/skillswap-ws.sock")
+RECONNECT_DELAY = 0.5
+MAX_FRAME_BYTES = 2 ** 20
+# A peer with more than this many bytes of frames it has not read yet is disconnected rather than buffered
+# for without bound; it reconnects and gets a fresh snapshot of who is online
+WS_BACKPLANE_MAX_BUFFER = int(os.getenv("WS_BACKPLANE_MAX_BUFFER", str(16 * 2 ** 20)))
+
+Deliver = Callable[[dict], Awaitable[None]]
+log = get_logger("backplane")
+
+
+def encode_frame(frame: dict) -> bytes: return dumps(frame) + b"\n"
+
+
+class LocalBackplane:
+    """Single-process backplane: every client lives in this worker, so there is nothing to route."""
+    node_id = "local"
+    async def start(self, deliver: Deliver, local_clients: Callable[[], Iterable[str]]): pass
+    async def stop(self): pass
+    def publish(self, frame: dict): pass
+    def join(self, client_id: str): pass
+    def leave(self, client_id: str): pass
+    def is_remote(self, client_id: str) -> bool: return False
+
+
+class UnixSocketBackplane:
+    """Routes websocket frames between the workers of one host over a Unix domain socket.
+
+    The first worker to take an exclusive flock on `<path>.lock` becomes the broker and listens on
+    `path`; every other worker connects to it. The broker relays each newline-delimited JSON frame to
+    all other workers and delivers it locally. If the broker dies its lock is released by the kernel,
+    the remaining workers reconnect and one of them takes over.
+
+    Workers announce which client ids they hold with join/leave frames, so `is_remote` can tell
+    whether a personal message has somewhere to go before the caller marks it delivered.
+    """
+
+    def __init__(self, path: str = WS_BACKPLANE_PATH):
+        self.path = path
+        self.node_id = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.remote: dict[str, set[str]] = {}  # client_id -> node ids holding a socket for it
+        self._peers: dict[asyncio.StreamWriter, set[tuple[str, str]]] = {}  # broker only: (node, client_id) announced per peer
+        self._upstream: Optional[asyncio.StreamWriter] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._lock_fd: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_broker(self) -> bool: return self._server is not None
+
+    async def start(self, deliver: Deliver, local_clients: Callable[[], Iterable[str]]):
+        self._deliver = deliver; self._local_clients = local_clients
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError): await self._task
+        if self._server:
+            self._server.close(); self._server = None
+            for writer in list(self._peers): writer.close()  # followers see EOF and elect a new broker
+            with suppress(FileNotFoundError): os.unlink(self.path)
+        if self._lock_fd is not None: os.close(self._lock_fd); self._lock_fd = None
+
+    def publish(self, frame: dict):
+        line = encode_frame(frame)
+        if self.is_broker:
+            for writer in list(self._peers): self._send(writer, line)
+        elif self._upstream is not None:
+            self._send(self._upstream, line)
+
+    def join(self, client_id: str): self.publish({"op": "join", "node": self.node_id, "client_id": client_id})
+    def leave(self, client_id: str): self.publish({"op": "leave", "node": self.node_id, "client_id": client_id})
+    def is_remote(self, client_id: str) -> bool: return bool(self.remote.get(client_id))
+
+    def _send(self, writer: asyncio.StreamWriter, line: bytes):
+        """Queue a frame without waiting for the peer; one that stopped reading is dropped once its backlog passes WS_BACKPLANE_MAX_BUFFER."""
+        transport = writer.transport
+        if transport.is_closing(): return
+        buffered = transport.get_write_buffer_size()
+        if buffered + len(line) > WS_BACKPLANE_MAX_BUFFER:
+            log.warning("backplane_peer_too_slow", node=self.node_id, buffered=buffered)
+            transport.abort()  # its read loop ends, which cleans up like any other disconnect
+            return
+        writer.write(line)
+
+    # ---------- election ----------
+    def _try_lock(self) -> bool:
+        import fcntl  # Unix only, like the socket itself
+        fd = os.open(self.path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try: fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError: os.close(fd); return False
+        self._lock_fd = fd
+        return True
+
+    async def _run(self):
+        while True:
+            if self._try_lock():
+                await self._serve()
+                return
+            try: reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_FRAME_BYTES)
+            except OSError: await asyncio.sleep(RECONNECT_DELAY); continue
+            await self._follow(reader, writer)
+            self.remote.clear()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    # ---------- broker side ----------
+    async def _serve(self):
+        with suppress(FileNotFoundError): os.unlink(self.path)  # stale socket from a dead broker
+        self._server = await asyncio.start_unix_server(self._handle_peer, self.path, limit=MAX_FRAME_BYTES)
+        log.info("backplane_broker", node=self.node_id, path=self.path)
+        await asyncio.Event().wait()  # hold the broker role until stop()
+
+    def _relay(self, frame: dict, exclude: Optional[asyncio.StreamWriter] = None):
+        line = encode_frame(frame)
+        for writer in list(self._peers):
+            if writer is not exclude: self._send(writer, line)
+
+    async def _handle_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        announced: set[tuple[str, str]] = set()
+        self._peers[writer] = announced
+        # Snapshot of who is online so the new worker can route personal messages immediately
+        for client_id in self._local_clients(): self._send(writer, encode_frame({"op": "join", "node": self.node_id, "client_id": client_id}))
+        for client_id, nodes in self.remote.items():
+            for node in nodes: self._send(writer, encode_frame({"op": "join", "node": node, "client_id": client_id}))
+        try:
+            async for line in reader:
+                frame = loads(line)
+                if frame["op"] == "join": announced.add((frame["node"], frame["client_id"]))
+                elif frame["op"] == "leave": announced.discard((frame["node"], frame["client_id"]))
+                self._relay(frame, exclude=writer)
+                await self._apply(frame)
+        except (ConnectionError, ValueError) as e:
+            log.warning("backplane_peer_dropped", node=self.node_id, error=str(e))
+        finally:
+            del self._peers[writer]; writer.close()
+            for node, client_id in announced:  # the worker is gone, and so are its sockets
+                frame = {"op": "leave", "node": node, "client_id": client_id}
+                self._relay(frame); await self._apply(frame)
+
+    # ---------- worker side ----------
+    async def _follow(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._upstream = writer
+        for client_id in self._local_clients(): self.join(client_id)
+        try:
+            async for line in reader: await self._apply(loads(line))
+        except (ConnectionError, ValueError) as e:
+            log.warning("backplane_broker_lost", node=self.node_id, error=str(e))
+        finally:
+            self._upstream = None; writer.close()
+
+    async def _apply(self, frame: dict):
+        op = frame["op"]
+        if op == "join":
+            self.remote.setdefault(frame["client_id"], set()).add(frame["node"])
+        elif op == "leave":
+            nodes = self.remote.get(frame["client_id"], set()); nodes.discard(frame["node"])
+            if not nodes: self.remote.pop(frame["client_id"], None)
+        else:
+            await self._deliver(frame)
+
+
+def backplane_from_env():
+    if WS_BACKPLANE == "unix": return UnixSocketBackplane(WS_BACKPLANE_PATH)
+    if WS_BACKPLANE == "local": return LocalBackplane()
+    raise RuntimeError(f"Unknown WS_BACKPLANE '{WS_BACKPLANE}': expected 'local' or 'unix'.")
@@ -0,0 +1,74 @@
+import os
+import asyncio
+from contextlib import suppress
+
+# After a failed flush the next one waits flush_interval * 2**failures, capped at this many seconds
+BATCH_RETRY_MAX_DELAY = float(os.getenv("BATCH_RETRY_MAX_DELAY", "5"))
+
+
+class Batcher:
+    """Write-behind buffer drained by one background task, as soon as flush_size items are buffered or
+    flush_interval seconds after the last flush. Flushes run one at a time, so batches go out in order.
+
+    Subclasses implement write(batch). A batch whose write raises goes back to the front of the buffer
+    and is retried with exponential backoff, so write() must be safe to repeat (duplicate-key inserts, idempotent
+    updates) and must drop documents that can never be written rather than raise for them forever.
+    """
+
+    def __init__(self, flush_size: int, flush_interval: float):
+        self.flush_size = flush_size; self.flush_interval = flush_interval
+        self._buffer: list = []
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+        self.failures = 0  # consecutive failed flushes
+
+    @property
+    def pending(self) -> int: return len(self._buffer)
+
+    def start(self): self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the timer and write out whatever is still buffered."""
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError): await self._task
+        await self.flush()
+
+    def _append(self, items: list):
+        self._buffer.extend(items)
+        if len(self._buffer) >= self.flush_size: self._wakeup.set()
+
+    def retry_delay(self) -> float: return min(BATCH_RETRY_MAX_DELAY, self.flush_interval * 2 ** self.failures)
+
+    async def _run(self):
+        while True:
+            if self.failures:  # the store is failing: back off instead of retrying on every wakeup
+                await asyncio.sleep(self.retry_delay())
+                await self.flush()
+                continue
+            # asyncio.timeout, not wait_for: on 3.11 wait_for swallows a cancel that lands as the wakeup fires, and stop() then hangs
+            with suppress(TimeoutError):
+                async with asyncio.timeout(self.flush_interval): await self._wakeup.wait()
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            if not self._buffer: return
+            batch, self._buffer = self._buffer, []
+            try:
+                await self.write(batch)
+            except asyncio.CancelledError:
+                self._buffer[:0] = batch  # cancelled by stop(), which flushes it again
+                raise
+            except Exception as e:
+                self._buffer[:0] = batch; self.failures += 1
+                self.write_failed(batch, e)
+                return
+            self.failures = 0
+
+    async def write(self, batch: list): raise NotImplementedError
+
+    def write_failed(self, batch: list, error: Exception):
+        """Called after a failed batch was put back for the next flush."""
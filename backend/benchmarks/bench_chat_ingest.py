@@ -0,0 +1,63 @@
+"""Chat messages per second one socket's receive loop can ingest, before and after write-behind.
+
+"before" awaits insert_one per message (the old websocket_endpoint path); "after" hands each
+message to chat_writer.MessageWriter. The collection is a stand-in that sleeps for a simulated
+Atlas round trip per call, so no database is needed.
+
+    cd backend && python benchmarks/bench_chat_ingest.py --messages 2000 --rtt-ms 5 --sockets 20
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from datetime import datetime
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chat_writer import MessageWriter  # noqa: E402
+
+
+class SlowCollection:
+    """Counts documents and round trips, sleeping `rtt` seconds per call."""
+    def __init__(self, rtt: float): self.rtt = rtt; self.docs = 0; self.calls = 0
+    async def insert_one(self, doc): await asyncio.sleep(self.rtt); self.docs += 1; self.calls += 1
+    async def insert_many(self, docs, ordered=True): await asyncio.sleep(self.rtt); self.docs += len(docs); self.calls += 1
+
+
+def message(i: int) -> dict:
+    return {"request_id": ObjectId(), "from_user": "alice", "to_user": "bob", "content": f"message {i}", "timestamp": datetime.utcnow()}
+
+
+async def before(collection, sockets: int, per_socket: int):
+    async def socket_loop():
+        for i in range(per_socket): await collection.insert_one(message(i))
+    await asyncio.gather(*[socket_loop() for _ in range(sockets)])
+
+
+async def after(collection, sockets: int, per_socket: int):
+    writer = MessageWriter(collection); writer.start()
+    async def socket_loop():
+        for i in range(per_socket):
+            await writer.add(message(i))
+            await asyncio.sleep(0)  # a real receive loop yields on every frame
+    await asyncio.gather(*[socket_loop() for _ in range(sockets)])
+    await writer.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000, help="total messages across all sockets")
+    parser.add_argument("--rtt-ms", type=float, default=5.0, help="simulated Mongo round trip")
+    parser.add_argument("--sockets", type=int, default=20)
+    args = parser.parse_args()
+    per_socket = args.messages // args.sockets
+    for name, fn in (("before (insert_one)", before), ("after (write-behind)", after)):
+        collection = SlowCollection(args.rtt_ms / 1000)
+        start = time.perf_counter(); asyncio.run(fn(collection, args.sockets, per_socket)); elapsed = time.perf_counter() - start
+        print(f"{name:22} {collection.docs / elapsed:10.0f} msg/s  {collection.docs} docs in {collection.calls} round trips, {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Latency of an unrelated endpoint while a burst of logins is hashing passwords.
+
+Runs two throwaway FastAPI apps in-process over httpx's ASGI transport: one verifies bcrypt
+inline in the handler (the old login path), the other goes through passwords.verify_password.
+No database is needed.
+
+    cd backend && python benchmarks/bench_password_hashing.py --logins 32
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import itertools
+import statistics
+
+import httpx
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from passwords import pwd_context, verify_password  # noqa: E402
+
+HASHED = pwd_context.hash("correct horse battery staple")
+PROBE_INTERVAL = 0.005
+
+
+def build_app(pooled: bool) -> FastAPI:
+    app = FastAPI()
+    @app.post("/login")
+    async def login():
+        ok = await verify_password("wrong", HASHED) if pooled else pwd_context.verify("wrong", HASHED)
+        return {"ok": ok}
+    @app.get("/ping")
+    async def ping(): return {"ok": True}
+    return app
+
+
+def pct(samples: list, p: float) -> float: return sorted(samples)[min(len(samples) - 1, int(len(samples) * p))]
+
+
+async def run(pooled: bool, logins: int) -> dict:
+    transport = httpx.ASGITransport(app=build_app(pooled))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        done = asyncio.Event()
+        async def probe():
+            # Probes follow a fixed schedule until the login burst is over, and latency counts from the
+            # scheduled send time, so time spent waiting for a blocked event loop is not hidden
+            latencies, t0 = [], time.perf_counter()
+            for i in itertools.count():
+                if done.is_set(): return latencies
+                scheduled = t0 + i * PROBE_INTERVAL
+                await asyncio.sleep(max(0, scheduled - time.perf_counter()))
+                await client.get("/ping"); latencies.append((time.perf_counter() - scheduled) * 1000)
+        async def burst():
+            await asyncio.sleep(PROBE_INTERVAL * 4)  # let the probe settle first
+            await asyncio.gather(*[client.post("/login") for _ in range(logins)])
+            done.set()
+        start = time.perf_counter()
+        latencies, _ = await asyncio.gather(probe(), burst())
+        elapsed = time.perf_counter() - start
+    return {"probes": len(latencies), "p50": statistics.median(latencies), "p99": pct(latencies, 0.99), "max": max(latencies), "elapsed": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=32)
+    args = parser.parse_args()
+    print(f"{args.logins} concurrent logins, /ping probed every {PROBE_INTERVAL * 1000:.0f}ms")
+    for pooled in (False, True):
+        r = asyncio.run(run(pooled, args.logins))
+        label = "thread pool" if pooled else "inline     "
+        print(f"{label}  /ping n={r['probes']} p50={r['p50']:.2f}ms p99={r['p99']:.2f}ms max={r['max']:.2f}ms  total={r['elapsed']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""Offline load-test suite: the whole app in-process, against an in-memory Mongo fake.
+
+HTTP goes through httpx's ASGI transport and websockets through a small in-process ASGI client,
+so nothing listens on a port and no database is needed. database.py only accepts the fake behind
+its explicit opt-in (SKILLSWAP_ALLOW_LOCAL_DB=1, MONGO_URL=mongomock://), which this script sets;
+point MONGO_URL at a local mongod instead to measure against a real server.
+
+Each scenario reports throughput and p50/p95/p99 latency and is compared with baselines.json;
+--save-baseline records a new one, --check exits 1 when anything regressed past --tolerance.
+Baselines are machine-specific: record them on the machine you compare on. The fake scans collections
+linearly, so query-heavy steps read slower than on a real server; compare runs with each other.
+
+    cd backend && pip install -r benchmarks/requirements.txt
+    python benchmarks/bench_suite.py
+    python benchmarks/bench_suite.py --only chat replay --check
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+from contextlib import suppress
+from datetime import datetime, timedelta
+
+os.environ.setdefault("MONGO_URL", "mongomock://skillswap")
+os.environ.setdefault("SKILLSWAP_ALLOW_LOCAL_DB", "1")
+os.environ.setdefault("SECRET_KEY", "offline-benchmark-secret-key-0123456789")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("WS_BACKPLANE", "local")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from bson import ObjectId  # noqa: E402
+
+import main  # noqa: E402
+from auth import create_access_token  # noqa: E402
+from passwords import pwd_context  # noqa: E402
+from database import users_collection, skills_collection, requests_collection, notifications_collection  # noqa: E402
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+SCENARIOS = ("auth", "market", "requests", "replay", "chat")
+
+
+def _patch_mongomock_bulk_write():
+    """mongomock's bulk_write predates the `sort` argument pymongo >= 4.9 passes to update ops; apply them one by one."""
+    from mongomock_motor import AsyncMongoMockCollection
+    from pymongo import InsertOne, ReplaceOne, UpdateOne
+
+    async def bulk_write(self, requests, ordered=True, **kwargs):
+        for op in requests:
+            if isinstance(op, InsertOne): await self.insert_one(op._doc)
+            elif isinstance(op, ReplaceOne): await self.replace_one(op._filter, op._doc, upsert=op._upsert)
+            elif isinstance(op, UpdateOne): await self.update_one(op._filter, op._doc, upsert=op._upsert)
+            else: raise NotImplementedError(type(op).__name__)
+    AsyncMongoMockCollection.bulk_write = bulk_write
+
+
+class ASGIWebSocket:
+    """Minimal in-process websocket client speaking the ASGI websocket protocol to the app."""
+    def __init__(self, app, path: str):
+        self.app = app; self.path = path
+        self._to_app: asyncio.Queue = asyncio.Queue(); self._from_app: asyncio.Queue = asyncio.Queue()
+
+    async def __aenter__(self):
+        scope = {"type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "path": self.path, "raw_path": self.path.encode(), "root_path": "",
+                 "query_string": b"", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 0), "server": ("bench", 80), "subprotocols": []}
+        self._task = asyncio.create_task(self.app(scope, self._to_app.get, self._from_app.put))
+        await self._to_app.put({"type": "websocket.connect"})
+        message = await self._from_app.get()
+        if message["type"] != "websocket.accept": raise RuntimeError(f"websocket rejected: {message}")
+        return self
+
+    async def send_text(self, text: str): await self._to_app.put({"type": "websocket.receive", "text": text})
+
+    async def receive_json(self, timeout: float = 10) -> dict:
+        message = await asyncio.wait_for(self._from_app.get(), timeout)
+        if message["type"] == "websocket.close": raise ConnectionError(f"closed with {message.get('code')}")
+        return json.loads(message["text"])
+
+    async def __aexit__(self, *exc):
+        await self._to_app.put({"type": "websocket.disconnect", "code": 1000})
+        with suppress(Exception): await asyncio.wait_for(self._task, 5)
+
+
+def summarize(samples: list[float], elapsed: float) -> dict:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000  # noqa: E731
+    return {"ops": len(ordered), "throughput": round(len(ordered) / elapsed, 1), "p50_ms": round(pick(0.50), 2), "p95_ms": round(pick(0.95), 2), "p99_ms": round(pick(0.99), 2)}
+
+
+async def run_concurrent(count: int, concurrency: int, op) -> tuple[list[float], float]:
+    """Run op(i) for i in range(count) with at most `concurrency` in flight; returns per-op latencies and wall time."""
+    semaphore, samples = asyncio.Semaphore(concurrency), []
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter(); await op(i); samples.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(count)])
+    return samples, time.perf_counter() - start
+
+
+def expect(response: httpx.Response, status: int = 200) -> httpx.Response:
+    if response.status_code != status: raise RuntimeError(f"{response.request.method} {response.request.url.path}: {response.status_code} {response.text[:200]}")
+    return response
+
+
+class Suite:
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client; self.args = args; self.rng = random.Random(args.seed)
+        self._password_hash = pwd_context.hash("benchpass")  # seeded users skip bcrypt; only the auth scenario pays for it
+
+    async def seed_users(self, prefix: str, count: int) -> list[tuple[str, dict]]:
+        names = [f"{prefix}{i}" for i in range(count)]
+        await users_collection.insert_many([{"username": n, "email": f"{n}@skillswap.dev", "password": self._password_hash} for n in names])
+        return [(n, {"Authorization": f"Bearer {create_access_token({'sub': n})}"}) for n in names]
+
+    async def seed_skills(self, owners: list[str], count: int) -> list[ObjectId]:
+        now = datetime.utcnow()
+        docs = [{"title": f"Skill {i}", "description": "Hands-on sessions for beginners", "category": self.rng.choice(["Tech", "Music", "Language", "Art"]),
+                 "availability": "Weekends", "owner": self.rng.choice(owners), "owner_email": "", "status": "in_progress",
+                 "created_at": now - timedelta(seconds=i), "updated_at": now - timedelta(seconds=i)} for i in range(count)]
+        return (await skills_collection.insert_many(docs)).inserted_ids
+
+    async def auth(self) -> dict:
+        n = self.args.users
+        signup, signup_time = await run_concurrent(n, self.args.concurrency, lambda i: self.client.post("/signup", json={"username": f"auth{i}", "email": f"auth{i}@skillswap.dev", "password": "benchpass"}))
+        login, login_time = await run_concurrent(n, self.args.concurrency, lambda i: self.client.post("/login", json={"username": f"auth{i}", "password": "benchpass"}))
+        return {"auth.signup": summarize(signup, signup_time), "auth.login": summarize(login, login_time)}
+
+    async def market(self) -> dict:
+        owners = await self.seed_users("seller", 50); viewers = await self.seed_users("buyer", 50)
+        await self.seed_skills([o for o, _ in owners], self.args.skills)
+        cursors = {}
+        async def first(i):
+            response = expect(await self.client.get("/skills/market", headers=viewers[i % len(viewers)][1]))
+            cursors[i % len(viewers)] = response.headers.get("X-Next-Cursor")
+        async def nxt(i):
+            expect(await self.client.get("/skills/market", params={"cursor": cursors[i % len(viewers)]}, headers=viewers[i % len(viewers)][1]))
+        first_samples, first_time = await run_concurrent(self.args.requests, self.args.concurrency, first)
+        next_samples, next_time = await run_concurrent(self.args.requests, self.args.concurrency, nxt)
+        return {"market.first_page": summarize(first_samples, first_time), "market.next_page": summarize(next_samples, next_time)}
+
+    async def requests(self) -> dict:
+        owners = await self.seed_users("owner", 20); requesters = await self.seed_users("learner", 100)
+        skill_ids = await self.seed_skills([o for o, _ in owners], 200)
+        skill_owner = {s["_id"]: s["owner"] for s in await skills_collection.find({"_id": {"$in": skill_ids}}, {"owner": 1}).to_list(length=None)}
+        headers = dict(owners)
+        pairs = [(requesters[i % len(requesters)], skill_ids[i % len(skill_ids)]) for i in range(self.args.requests)]
+        async def create(i):
+            (_, h), skill_id = pairs[i]
+            expect(await self.client.post("/requests", json={"skill_id": str(skill_id), "message": "hi"}, headers=h), 201)
+        created, created_time = await run_concurrent(len(pairs), self.args.concurrency, create)
+        pending = await requests_collection.find({"status": "pending", "from_user": {"$regex": "^learner"}}, {"skill_id": 1}).to_list(length=None)
+        async def respond(i):
+            req = pending[i]
+            expect(await self.client.put(f"/requests/{req['_id']}/respond", json={"action": "accepted"}, headers=headers[skill_owner[req["skill_id"]]]))
+        responded, responded_time = await run_concurrent(len(pending), self.args.concurrency, respond)
+        return {"requests.create": summarize(created, created_time), "requests.respond": summarize(responded, responded_time)}
+
+    async def replay(self) -> dict:
+        users = await self.seed_users("offline", self.args.sockets)
+        now = datetime.utcnow()
+        await notifications_collection.insert_many([{"type": "new_request", "request_id": ObjectId(), "from_user": "someone", "to_user": name, "skill_title": "Skill",
+                                                     "skill_id": ObjectId(), "message": "hi", "created_at": now + timedelta(milliseconds=j), "delivered": False}
+                                                    for name, _ in users for j in range(self.args.notifications)])
+        async def connect(i):
+            async with ASGIWebSocket(main.app, f"/ws/{users[i][0]}") as ws:
+                frame = await ws.receive_json()
+                if frame["type"] != "notification_batch": raise RuntimeError(f"unexpected frame {frame['type']}")
+        samples, elapsed = await run_concurrent(len(users), self.args.concurrency, connect)
+        return {"replay.connect_to_batch": summarize(samples, elapsed)}
+
+    async def chat(self) -> dict:
+        pairs = self.args.sockets // 2
+        users = await self.seed_users("chatter", pairs * 2)
+        request_ids = (await requests_collection.insert_many([{"from_user": users[2 * p][0], "to_user": users[2 * p + 1][0], "skill_id": ObjectId(), "status": "accepted",
+                                                              "created_at": datetime.utcnow(), "last_activity_at": datetime.utcnow()} for p in range(pairs)])).inserted_ids
+        samples: list[float] = []
+        async def conversation(p):
+            sender, receiver = users[2 * p][0], users[2 * p + 1][0]
+            async with ASGIWebSocket(main.app, f"/ws/{receiver}") as inbox, ASGIWebSocket(main.app, f"/ws/{sender}") as outbox:
+                async def receive():
+                    for _ in range(self.args.messages):
+                        frame = await inbox.receive_json()
+                        samples.append(time.perf_counter() - float(frame["content"]))
+                reader = asyncio.create_task(receive())
+                for _ in range(self.args.messages):
+                    await outbox.send_text(json.dumps({"type": "chat_message", "request_id": str(request_ids[p]), "to": receiver, "content": repr(time.perf_counter())}))
+                    await asyncio.sleep(0)
+                await reader
+        start = time.perf_counter()
+        await asyncio.gather(*[conversation(p) for p in range(pairs)])
+        await main.message_writer.flush()  # throughput includes persisting every message
+        return {"chat.deliver": summarize(samples, time.perf_counter() - start)}
+
+
+def compare(results: dict, baselines: dict, tolerance: float) -> list[str]:
+    regressions = []
+    print(f"\n{'operation':26} {'ops':>6} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  vs baseline")
+    for name, r in results.items():
+        base = baselines.get(name); note = "(no baseline)"
+        if base:
+            p95_delta, tput_delta = r["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0, r["throughput"] / base["throughput"] - 1 if base["throughput"] else 0
+            note = f"p95 {p95_delta:+.0%}, throughput {tput_delta:+.0%}"
+            if p95_delta > tolerance or tput_delta < -tolerance: regressions.append(name); note += "  REGRESSION"
+        print(f"{name:26} {r['ops']:6} {r['throughput']:9.1f} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} {r['p99_ms']:8.2f}  {note}")
+    return regressions
+
+
+async def run(args) -> dict:
+    if os.environ["MONGO_URL"].startswith("mongomock://"): _patch_mongomock_bulk_write()
+    results = {}
+    async with main.app.router.lifespan_context(main.app):  # startup/shutdown handlers: indexes, writer, background jobs
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=60) as client:
+            suite = Suite(client, args)
+            for name in args.only or SCENARIOS:
+                print(f"running {name}...", flush=True)
+                results.update(await getattr(suite, name)())
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=SCENARIOS)
+    parser.add_argument("--users", type=int, default=40, help="signups/logins in the auth scenario (bcrypt bound)")
+    parser.add_argument("--skills", type=int, default=2000, help="skills seeded for the market scenario")
+    parser.add_argument("--requests", type=int, default=400, help="HTTP operations per market/request scenario step")
+    parser.add_argument("--sockets", type=int, default=40, help="websocket clients in the replay and chat scenarios")
+    parser.add_argument("--notifications", type=int, default=60, help="undelivered notifications per user before replay")
+    parser.add_argument("--messages", type=int, default=200, help="chat messages per conversation")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed p95 increase / throughput drop before flagging (shared machines vary by ~30%% run to run)")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any operation regressed")
+    args = parser.parse_args()
+    results = asyncio.run(run(args))
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as f: baselines = json.load(f)
+    regressions = compare(results, baselines.get("results", {}), args.tolerance)
+    if args.save_baseline:
+        merged = {**baselines.get("results", {}), **results}
+        with open(BASELINES, "w") as f:
+            json.dump({"machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}, "mongo": os.environ["MONGO_URL"].split("://")[0],
+                       "recorded_at": datetime.utcnow().isoformat(timespec="seconds"), "results": merged}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline saved to {BASELINES}")
+    if args.check and regressions: sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,123 @@
+import os
+import asyncio
+from typing import Optional
+
+from bson import ObjectId, encode
+from bson.errors import InvalidDocument
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from batcher import Batcher
+from logs import get_logger
+
+# Flush as soon as this many messages are buffered...
+CHAT_FLUSH_SIZE = int(os.getenv("CHAT_FLUSH_SIZE", "100"))
+# ...or when the oldest buffered message is this many seconds old
+CHAT_FLUSH_INTERVAL = float(os.getenv("CHAT_FLUSH_INTERVAL", "0.05"))
+# Past this many unflushed messages, add() waits for a successful flush (backpressure while Mongo is slow or down)
+CHAT_MAX_PENDING = int(os.getenv("CHAT_MAX_PENDING", "5000"))
+DUPLICATE_KEY = 11000
+MAX_BSON_SIZE = 16 * 2 ** 20  # Mongo's document size limit
+
+log = get_logger("chat_writer")
+
+
+def unstorable(doc: dict) -> Optional[str]:
+    """Why Mongo could never store `doc` (a value or key BSON cannot encode, or too large), or None if it can."""
+    try: size = len(encode(doc))
+    except (InvalidDocument, OverflowError) as e: return str(e)
+    return f"document is {size} bytes, over the {MAX_BSON_SIZE} byte limit" if size > MAX_BSON_SIZE else None
+
+
+def _unread_field(username: str) -> str: return username.replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def unread_key(username: str) -> str:
+    """Dotted path on a request doc holding `username`'s unread count ('.' and '$' escaped)."""
+    return "unread." + _unread_field(username)
+
+
+def unread_count(request_doc: dict, username: str) -> int: return request_doc.get("unread", {}).get(_unread_field(username), 0)
+
+
+def chat_summary_updates(batch: list) -> list:
+    """Per-chat request doc updates for a flushed batch: last message preview, activity time, unread counts."""
+    last, unread = {}, {}
+    for doc in batch:
+        last[doc["request_id"]] = doc
+        key = (doc["request_id"], doc["to_user"]); unread[key] = unread.get(key, 0) + 1
+    ops = [UpdateOne({"_id": request_id, "$or": [{"last_activity_at": {"$lt": doc["timestamp"]}}, {"last_activity_at": None}]},
+                     {"$set": {"last_message": doc["content"], "last_message_from": doc["from_user"], "last_activity_at": doc["timestamp"]}})
+           for request_id, doc in last.items()]
+    ops += [UpdateOne({"_id": request_id}, {"$inc": {unread_key(to_user): count}}) for (request_id, to_user), count in unread.items()]
+    return ops
+
+
+class MessageWriter(Batcher):
+    """Write-behind buffer for chat messages.
+
+    Messages get their ObjectId here, so the id forwarded to the recipient is the one that ends up
+    in Mongo, and a batch retried after a failure cannot create duplicates (re-inserts hit the
+    unique _id and are ignored). Batches go out one insert_many at a time, keeping chat order.
+
+    With a `summary_collection` (the requests collection), each successful flush also updates the
+    chat's last message and unread counters in one bulk_write, so listing chats needs no per-row query.
+    """
+
+    def __init__(self, collection, summary_collection=None, flush_size: int = CHAT_FLUSH_SIZE, flush_interval: float = CHAT_FLUSH_INTERVAL, max_pending: int = CHAT_MAX_PENDING):
+        super().__init__(flush_size, flush_interval)
+        self.collection = collection; self.summary_collection = summary_collection
+        self.max_pending = max_pending
+        self._room = asyncio.Event(); self._room.set()  # cleared while the buffer is at max_pending
+        self.stats = {"written": 0, "batches": 0, "failed_batches": 0, "blocked_adds": 0, "dropped": 0}
+
+    async def add(self, doc: dict) -> dict:
+        """Buffer a message. With max_pending already buffered (Mongo slow or down), wait until a flush
+        succeeds and frees room, so the caller's websocket stops being read instead of the buffer growing.
+
+        Raises InvalidDocument for a message that could never be inserted: buffered, it would fail its batch on every retry.
+        """
+        doc.setdefault("_id", ObjectId())
+        reason = unstorable(doc)
+        if reason: raise InvalidDocument(reason)
+        if len(self._buffer) >= self.max_pending: self.stats["blocked_adds"] += 1
+        while len(self._buffer) >= self.max_pending:
+            self._room.clear(); self._wakeup.set()
+            await self._room.wait()
+        self._append([doc])
+        return doc
+
+    async def write(self, batch: list):
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+        except (InvalidDocument, OverflowError):
+            # Only documents that skipped add()'s check get here; those sent before the bad one come back as duplicates
+            checked = [(doc, unstorable(doc)) for doc in batch]
+            bad = [(doc, reason) for doc, reason in checked if reason]
+            if not bad: raise
+            self._drop([doc for doc, _ in bad], bad[0][1])
+            batch = [doc for doc, reason in checked if not reason]
+            if batch: await self.write(batch)
+            return
+        except BulkWriteError as e:
+            if e.details.get("writeConcernErrors"): raise
+            # Documents that did get in on an earlier try are skipped as duplicate keys. Any other per-document
+            # error (validation, size) would come back on every retry, so those messages are dropped, not retried
+            rejected = {err["index"]: err.get("errmsg", "") for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY}
+            if rejected:
+                self._drop([batch[i] for i in rejected], next(iter(rejected.values())))
+                batch = [doc for i, doc in enumerate(batch) if i not in rejected]
+        self.stats["written"] += len(batch); self.stats["batches"] += 1
+        if len(self._buffer) < self.max_pending: self._room.set()
+        if self.summary_collection is not None and batch:
+            try: await self.summary_collection.bulk_write(chat_summary_updates(batch), ordered=False)
+            except Exception as e: log.error("chat_summary_update_failed", chats=len(batch), error=str(e))
+
+    def write_failed(self, batch: list, error: Exception):
+        self.stats["failed_batches"] += 1
+        log.warning("chat_insert_failed", messages=len(batch), pending=len(self._buffer), error=str(error))
+
+    def _drop(self, docs: list, error: str):
+        """Dead-letter messages Mongo will never accept: logged with their ids and left out of the retry."""
+        self.stats["dropped"] += len(docs)
+        for doc in docs: log.error("chat_message_dropped", message_id=doc.get("_id"), request_id=doc.get("request_id"), from_user=doc.get("from_user"), error=error)
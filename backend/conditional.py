@@ -0,0 +1,44 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+from serialization import dumps, page_response
+
+# Per-user resources: the browser may keep them but must revalidate, and must not share them across tokens
+CACHE_HEADERS = {"Cache-Control": "private, no-cache", "Vary": "Authorization"}
+
+
+def make_etag(version: Any) -> str:
+    """Weak ETag over a version key (updated_at stamps, ids), so it is cheap to compute and needs no body."""
+    return 'W/"' + hashlib.blake2b(dumps(version), digest_size=12).hexdigest() + '"'
+
+
+def _utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """RFC 9110 precedence: If-None-Match (weak comparison) wins; If-Modified-Since is only used without it."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try: since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError): return False
+        return _utc(last_modified).replace(microsecond=0) <= _utc(since)
+    return False
+
+
+def conditional_response(request: Request, content: Any, version: Any, last_modified: Optional[datetime] = None, next_cursor: Optional[str] = None) -> Response:
+    """JSON response carrying ETag/Last-Modified, or a bodiless 304 when the client's copy is current."""
+    etag = make_etag(version)
+    headers = {**CACHE_HEADERS, "ETag": etag}
+    if last_modified: headers["Last-Modified"] = format_datetime(_utc(last_modified), usegmt=True)
+    if is_not_modified(request, etag, last_modified): return Response(status_code=304, headers=headers)
+    response = page_response(content, next_cursor); response.headers.update(headers)
+    return response
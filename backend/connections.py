@@ -0,0 +1,210 @@
+import os
+import sys
+import time
+import asyncio
+from contextlib import suppress
+from datetime import datetime
+from typing import Callable, Optional
+
+from fastapi import WebSocket
+
+from backplane import backplane_from_env
+from serialization import dumps_text
+from logs import get_logger
+from metrics import WS_ACTIVE, WS_SEND_LATENCY
+
+# Frames buffered per socket before it is considered too slow and evicted
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "256"))
+# A single send_text taking longer than this marks the socket as dead
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+# Queue depth from which a socket counts as lagging
+WS_LAG_THRESHOLD = WS_QUEUE_SIZE // 2
+# Sockets one user may hold (tabs, devices); connecting another closes their oldest
+WS_MAX_SOCKETS_PER_USER = int(os.getenv("WS_MAX_SOCKETS_PER_USER", "5"))
+# Every socket gets {"type": "ping"} this often and answers {"type": "pong"}...
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "25"))
+# ...and one that has sent nothing for this long is reaped as half-open
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "60"))
+# Notifications for one user within this window go out as a single notification_batch frame (0 disables)
+WS_COALESCE_WINDOW = float(os.getenv("WS_COALESCE_WINDOW", "0.05"))
+WS_COALESCE_MAX = 50
+WS_CLOSE_TRY_AGAIN_LATER = 1013
+PING_FRAME = dumps_text({"type": "ping"})
+
+log = get_logger("ws")
+
+Done = Callable[[bool], None]
+
+
+class Connection:
+    """One accepted websocket with its bounded outbound queue, drained by its own writer task."""
+    def __init__(self, websocket: WebSocket, client_id: str, manager: "ConnectionManager"):
+        self.websocket = websocket; self.client_id = client_id; self.manager = manager
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=WS_QUEUE_SIZE)
+        self.queued_bytes = 0
+        self.last_seen = time.monotonic()
+        self.connected_at = datetime.utcnow()  # wall clock, comparable with stored created_at
+        self.writer = asyncio.create_task(self._drain())
+    def touch(self): self.last_seen = time.monotonic()
+    def memory(self) -> int:
+        """Approximate bytes this worker holds for the socket: bookkeeping objects plus queued frames (not the ASGI server's buffers)."""
+        return sum(map(sys.getsizeof, (self, self.__dict__, self.queue, self.queue._queue, self.writer))) + self.queued_bytes
+    async def _drain(self):
+        while True:
+            message = await self.queue.get()
+            self.queued_bytes -= sys.getsizeof(message)
+            try:
+                start = time.perf_counter()
+                await asyncio.wait_for(self.websocket.send_text(message), WS_SEND_TIMEOUT)
+                WS_SEND_LATENCY.observe(time.perf_counter() - start); self.manager.stats["sent"] += 1
+            except Exception as e:
+                self.manager.stats["send_errors"] += 1
+                self.manager.evict(self, f"send failed: {e!r}")
+                return
+
+
+# --- WebSocket Manager ---
+class ConnectionManager:
+    """Websockets held by this worker, several per user. Frames for clients on other workers go through the backplane.
+
+    Sends never await a socket: frames are put on each connection's bounded queue and written by its
+    writer task, so one slow client cannot hold up a broadcast. A socket whose queue overflows is evicted,
+    and one that stops answering the heartbeat ping is reaped.
+    """
+    def __init__(self, backplane=None):
+        self.active_connections: dict[str, list[Connection]] = {}
+        self.backplane = backplane or backplane_from_env()
+        self.sockets = 0
+        self._pending: dict[str, list[tuple[dict, Optional[Done]]]] = {}  # notifications waiting out the coalescing window, per user
+        self._heartbeat: Optional[asyncio.Task] = None
+        self.stats = {"sent": 0, "dropped": 0, "lagging": 0, "evicted": 0, "send_errors": 0, "reaped": 0, "replaced": 0, "coalesced": 0}
+    async def start(self):
+        await self.backplane.start(self._deliver, lambda: list(self.active_connections))
+        self._heartbeat = asyncio.create_task(self._run_heartbeat())
+    async def stop(self):
+        if self._heartbeat: self._heartbeat.cancel()
+        await self.backplane.stop()
+        for conn in self.connections(): conn.writer.cancel()
+    def connections(self) -> list[Connection]: return [conn for conns in self.active_connections.values() for conn in conns]
+    def connected_since(self) -> dict[str, datetime]:
+        """When each local user's earliest live socket connected."""
+        return {client_id: min(conn.connected_at for conn in conns) for client_id, conns in self.active_connections.items()}
+    async def connect(self, websocket: WebSocket, client_id: str) -> Connection:
+        await websocket.accept()
+        conns = self.active_connections.get(client_id, [])
+        while len(conns) >= WS_MAX_SOCKETS_PER_USER: self.stats["replaced"] += 1; self.evict(conns[0], "socket limit for user")
+        conn = Connection(websocket, client_id, self)
+        if client_id not in self.active_connections: self.active_connections[client_id] = []; self.backplane.join(client_id)
+        self.active_connections[client_id].append(conn); self.sockets += 1
+        WS_ACTIVE.set(self.sockets); log.info("ws_connected", client_id=client_id, sockets=len(self.active_connections[client_id]))
+        return conn
+    def _remove(self, conn: Connection) -> bool:
+        conns = self.active_connections.get(conn.client_id)
+        if not conns or conn not in conns: return False
+        conns.remove(conn); self.sockets -= 1; WS_ACTIVE.set(self.sockets)
+        if not conns:
+            del self.active_connections[conn.client_id]; self.backplane.leave(conn.client_id)
+            for _, done in self._pending.pop(conn.client_id, ()):  # the last socket closed inside the coalescing window
+                if done: done(False)
+        return True
+    def disconnect(self, conn: Connection):
+        if self._remove(conn):
+            conn.writer.cancel(); log.info("ws_disconnected", client_id=conn.client_id, sockets=len(self.active_connections.get(conn.client_id, ())))
+    def evict(self, conn: Connection, reason: str):
+        """Drop a slow, dead or idle socket: forget it, stop its writer and close it in the background."""
+        self._remove(conn)
+        if conn.writer is not asyncio.current_task(): conn.writer.cancel()
+        self.stats["evicted"] += 1
+        log.warning("ws_evicted", client_id=conn.client_id, reason=reason)
+        asyncio.create_task(self._close(conn.websocket))
+    async def _close(self, websocket: WebSocket):
+        with suppress(Exception): await asyncio.wait_for(websocket.close(code=WS_CLOSE_TRY_AGAIN_LATER), WS_SEND_TIMEOUT)
+    async def _run_heartbeat(self):
+        while True:
+            await asyncio.sleep(WS_PING_INTERVAL)
+            self.heartbeat()
+    def heartbeat(self):
+        """Reap sockets that have been silent for WS_IDLE_TIMEOUT and ping the rest."""
+        cutoff = time.monotonic() - WS_IDLE_TIMEOUT
+        for conn in self.connections():
+            if conn.last_seen < cutoff: self.stats["reaped"] += 1; self.evict(conn, "idle")
+            else: self._enqueue(conn, PING_FRAME)
+        log.debug("ws_heartbeat", **self.memory_stats())
+    def memory_stats(self) -> dict:
+        sizes = [conn.memory() for conn in self.connections()]
+        return {"sockets": len(sizes), "users": len(self.active_connections), "memory_bytes": sum(sizes),
+                "memory_bytes_per_socket": sum(sizes) / len(sizes) if sizes else 0, "memory_bytes_max": max(sizes, default=0)}
+    def _enqueue(self, conn: Connection, message: str) -> bool:
+        if conn.queue.qsize() >= WS_LAG_THRESHOLD: self.stats["lagging"] += 1
+        try: conn.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            self.evict(conn, "outbound queue full")
+            return False
+        conn.queued_bytes += sys.getsizeof(message)
+        return True
+    async def broadcast(self, data: dict): self._broadcast_local(data); self.backplane.publish({"op": "broadcast", "data": data})
+    def _broadcast_local(self, data: dict):
+        message = dumps_text(data) # encoded once for every socket
+        for conn in self.connections(): self._enqueue(conn, message)
+    async def send_personal_message(self, data: dict, client_id: str) -> bool:
+        """Queue a personal websocket message on every socket of the user, here and on other workers.
+        Returns True if queued locally or handed to a worker holding one of the user's sockets, False otherwise."""
+        sent = self._send_local(data, client_id)
+        if self.backplane.is_remote(client_id):  # the user may have sockets here and elsewhere
+            self.backplane.publish({"op": "personal", "client_id": client_id, "data": data}); sent = True
+            log.debug("ws_routed", client_id=client_id)
+        if not sent: log.info("ws_not_connected", client_id=client_id)
+        return sent
+    async def notify(self, data: dict, client_id: str, done: Optional[Done] = None):
+        """send_personal_message for notifications: a burst for one user is coalesced into one notification_batch frame.
+
+        The outcome is reported once through done(sent): True when the frame was queued on a socket or handed
+        to another worker holding one of the user's sockets, False when the user is offline or their last socket closed first.
+        """
+        local = client_id in self.active_connections
+        if self.backplane.is_remote(client_id):
+            self.backplane.publish({"op": "notify", "client_id": client_id, "data": data})
+            if local: self._notify_local(data, client_id)
+            if done: done(True)  # the handoff counts as sent, whatever happens to the local sockets
+        elif local: self._notify_local(data, client_id, done)
+        else:
+            log.info("ws_not_connected", client_id=client_id)
+            if done: done(False)
+    def send_to(self, conn: Connection, data: dict) -> bool: return self._enqueue(conn, dumps_text(data))
+    def _send_local(self, data: dict, client_id: str) -> bool:
+        conns = self.active_connections.get(client_id)
+        if not conns: return False
+        message = dumps_text(data) # ObjectId/datetime handled by the shared orjson encoder
+        sent = False
+        for conn in list(conns): sent = self._enqueue(conn, message) or sent
+        return sent
+    def _notify_local(self, data: dict, client_id: str, done: Optional[Done] = None):
+        if client_id not in self.active_connections:
+            if done: done(False)
+            return
+        if WS_COALESCE_WINDOW <= 0:
+            sent = self._send_local(data, client_id)
+            if done: done(sent)
+            return
+        pending = self._pending.get(client_id)
+        if pending is None:
+            self._pending[client_id] = [(data, done)]
+            asyncio.get_running_loop().call_later(WS_COALESCE_WINDOW, self._flush_notifications, client_id)
+        else:
+            pending.append((data, done))
+            if len(pending) >= WS_COALESCE_MAX: self._flush_notifications(client_id)
+    def _flush_notifications(self, client_id: str):
+        pending = self._pending.pop(client_id, None)
+        if not pending: return
+        if len(pending) == 1: sent = self._send_local(pending[0][0], client_id)  # a lone notification keeps its live shape
+        else:
+            self.stats["coalesced"] += len(pending) - 1
+            sent = self._send_local({"type": "notification_batch", "notifications": [data for data, _ in pending], "has_more": False}, client_id)
+        for _, done in pending:
+            if done: done(sent)
+    async def _deliver(self, frame: dict):
+        """Frames published by other workers."""
+        if frame["op"] == "broadcast": self._broadcast_local(frame["data"])
+        elif frame["op"] == "personal": self._send_local(frame["data"], frame["client_id"])
+        elif frame["op"] == "notify": self._notify_local(frame["data"], frame["client_id"])
@@ -1,10 +1,15 @@
 import os
 import asyncio
+from datetime import datetime
+from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from dotenv import load_dotenv
 import urllib.parse
 import sys
 
+from metrics import MongoCommandMetrics
+
 if sys.platform == 'win32':
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
@@ -23,17 +28,116 @@ else:
         raise RuntimeError("Missing MongoDB configuration: set MONGO_URL or set MONGO_USER and MONGO_CLUSTER in your environment (.env).")
     mongo_uri = f"mongodb+srv://{user}:{password}@{cluster}/?retryWrites=true&w=majority"
 
+# Explicit opt-in (benchmarks, local development) for a local mongod or the in-memory "mongomock://" fake
+ALLOW_LOCAL_DB = os.getenv("SKILLSWAP_ALLOW_LOCAL_DB") == "1"
+
 # Safety: avoid accidental local fallback to mongodb://localhost
-if "localhost" in mongo_uri or "127.0.0.1" in mongo_uri:
-    raise RuntimeError("MongoDB URI appears to point to localhost. Expected an Atlas URI. Aborting to avoid accidental writes to local DB.")
+if ("localhost" in mongo_uri or "127.0.0.1" in mongo_uri or mongo_uri.startswith("mongomock://")) and not ALLOW_LOCAL_DB:
+    raise RuntimeError("MongoDB URI appears to point to localhost. Expected an Atlas URI. Aborting to avoid accidental writes to local DB. Set SKILLSWAP_ALLOW_LOCAL_DB=1 to allow it.")
 
-client = AsyncIOMotorClient(mongo_uri)
+if mongo_uri.startswith("mongomock://"):
+    from mongomock_motor import AsyncMongoMockClient  # benchmark-only dependency (benchmarks/requirements.txt)
+    client = AsyncMongoMockClient()
+else:
+    client = AsyncIOMotorClient(mongo_uri, event_listeners=[MongoCommandMetrics()]) # per-command timings for /metrics
 db = client.get_database("skillswap")
 
+# Multi-document transactions need a replica set (Atlas always is). Set MONGO_TRANSACTIONS=0 for a standalone
+# local mongod; the mongomock fake has no sessions at all. Without them, run_in_transaction writes in order.
+TRANSACTIONS = os.getenv("MONGO_TRANSACTIONS", "1") == "1" and not mongo_uri.startswith("mongomock://")
+
+
+async def run_in_transaction(callback):
+    """Await `callback(session)` inside a transaction (with_transaction retries it on transient errors), or with session=None when transactions are off."""
+    if not TRANSACTIONS: return await callback(None)
+    async with await client.start_session() as session:
+        return await session.with_transaction(callback)
+
 users_collection = db.users
 skills_collection = db.skills
 requests_collection = db.requests
 notifications_collection = db.notifications
+notifications_archive_collection = db.notifications_archive
+messages_collection = db.messages
+
+# Archived notifications (see notification_retention.py) are deleted by a TTL index this long after archiving
+NOTIFICATION_ARCHIVE_TTL_DAYS = int(os.getenv("NOTIFICATION_ARCHIVE_TTL_DAYS", "365"))
+
+# ---------- Index registry ----------
+# Every index the routes rely on, per collection. Applied idempotently at startup by ensure_indexes();
+# add the index here together with any new query shape below.
+INDEXES = {
+    "users": [
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "skills": [
+        IndexModel([("owner", ASCENDING), ("updated_at", DESCENDING)]),
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "requests": [
+        IndexModel([("from_user", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("to_user", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("from_user", ASCENDING), ("last_activity_at", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("to_user", ASCENDING), ("last_activity_at", DESCENDING)]),
+        IndexModel([("skill_id", ASCENDING)]),
+    ],
+    "notifications": [
+        IndexModel([("to_user", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("to_user", ASCENDING), ("delivered", ASCENDING), ("created_at", ASCENDING)]),
+        IndexModel([("to_user", ASCENDING), ("read", ASCENDING)]),
+        IndexModel([("created_at", ASCENDING)]),
+    ],
+    "notifications_archive": [
+        IndexModel([("archived_at", ASCENDING)], expireAfterSeconds=NOTIFICATION_ARCHIVE_TTL_DAYS * 86400),
+    ],
+    "messages": [
+        IndexModel([("request_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    ],
+}
+
+# Representative (collection, filter, sort) shapes of the queries the routes issue, checked by check_query_plans()
+_user, _oid, _ts = "someone", ObjectId(), datetime(2024, 1, 1)
+QUERY_SHAPES = [
+    ("users", {"username": _user}, None),
+    ("users", {"$or": [{"username": _user}, {"email": "someone@example.com"}]}, None),
+    ("skills", {"owner": _user}, [("updated_at", -1)]),
+    ("skills", {"owner": {"$ne": _user}}, [("created_at", -1), ("_id", -1)]),
+    ("skills", {"$and": [{"owner": {"$ne": _user}}, {"$or": [{"created_at": {"$lt": _ts}}, {"created_at": _ts, "_id": {"$lt": _oid}}]}]}, [("created_at", -1), ("_id", -1)]),
+    ("requests", {"from_user": _user}, [("created_at", -1), ("_id", -1)]),
+    ("requests", {"to_user": _user}, [("created_at", -1), ("_id", -1)]),
+    ("requests", {"$or": [{"status": "accepted", "from_user": _user}, {"status": "accepted", "to_user": _user}]}, [("last_activity_at", -1), ("created_at", -1)]),
+    ("requests", {"skill_id": _oid}, None),
+    ("notifications", {"to_user": _user}, [("created_at", -1), ("_id", -1)]),
+    ("notifications", {"to_user": _user, "delivered": False}, None),
+    ("notifications", {"to_user": _user, "read": {"$ne": True}}, None),
+    ("notifications", {"created_at": {"$lt": _ts}}, [("created_at", 1)]),
+    ("messages", {"request_id": _oid}, [("timestamp", -1), ("_id", -1)]),
+]
+
+
+async def ensure_indexes():
+    for name, models in INDEXES.items():
+        await db[name].create_indexes(models)
+
+
+def _has_collscan(plan) -> bool:
+    if isinstance(plan, dict):
+        return plan.get("stage") == "COLLSCAN" or any(_has_collscan(v) for v in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(v) for v in plan)
+    return False
+
+
+async def check_query_plans() -> list[str]:
+    """explain() every registered query shape; returns a description of each one whose winning plan is a COLLSCAN."""
+    failures = []
+    for name, query, sort in QUERY_SHAPES:
+        command = {"find": name, "filter": query, "limit": 50, **({"sort": dict(sort)} if sort else {})}
+        explained = await db.command("explain", command, verbosity="queryPlanner")
+        if _has_collscan(explained["queryPlanner"]["winningPlan"]):
+            failures.append(f"{name}: filter={query} sort={sort}")
+    return failures
 
 async def test_connection():
     try:
@@ -48,5 +152,15 @@ async def test_connection():
     except Exception as e:
         print(f"❌ Connection failed. Error: {e}")
 
+async def check_indexes() -> int:
+    await ensure_indexes()
+    failures = await check_query_plans()
+    for f in failures: print(f"❌ COLLSCAN: {f}")
+    if not failures: print(f"✅ All {len(QUERY_SHAPES)} query shapes use an index.")
+    return 1 if failures else 0
+
 if __name__ == "__main__":
+    # python database.py                 -> connectivity check
+    # python database.py --check-indexes -> apply INDEXES and fail on any COLLSCAN query shape
+    if "--check-indexes" in sys.argv: sys.exit(asyncio.run(check_indexes()))
     asyncio.run(test_connection())
\ No newline at end of file
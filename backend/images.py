@@ -0,0 +1,137 @@
+import os
+import uuid
+import hashlib
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import anyio
+from fastapi import HTTPException, UploadFile
+from fastapi.staticfiles import StaticFiles
+from starlette.responses import JSONResponse
+
+IMAGE_DIR = "static/images"
+# Largest accepted profile picture. UploadLimitMiddleware refuses bigger request bodies with a 413 as they
+# arrive, so Starlette never spools more than this (plus multipart framing) to its temp file
+PROFILE_PIC_MAX_BYTES = int(os.getenv("PROFILE_PIC_MAX_BYTES", str(5 * 1024 * 1024)))
+# Allowance for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 16 * 1024
+# Longest side of the avatar thumbnail, in pixels
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "128"))
+# Pillow decoding/resizing is CPU bound and holds the GIL, so it runs in worker processes
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+CHUNK_SIZE = 64 * 1024
+FORMATS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp"}
+# Filenames are content hashes, so a URL never changes meaning and browsers/CDNs may keep it forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _process_image(upload_path: str, digest: str, directory: str) -> tuple[str, str]:
+    """Validate an upload and file it under its content hash next to a thumbnail; returns both file names.
+
+    Runs in a worker process. If the same bytes were uploaded before, the stored copy is reused.
+    """
+    from PIL import Image, UnidentifiedImageError
+    try:
+        with Image.open(upload_path) as image:
+            ext = FORMATS.get(image.format)
+            if ext is None: raise ValueError(f"unsupported image format {image.format}")
+            image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            has_alpha = image.mode in ("RGBA", "LA", "P")
+            thumb_name = f"{digest}_{THUMBNAIL_SIZE}.{'png' if has_alpha else 'jpg'}"
+            thumb_path = os.path.join(directory, thumb_name)
+            if not os.path.exists(thumb_path):
+                thumb_tmp = f"{thumb_path}.{uuid.uuid4().hex}.tmp"
+                image.convert("RGBA" if has_alpha else "RGB").save(thumb_tmp, "PNG" if has_alpha else "JPEG", quality=85, optimize=True)
+                os.replace(thumb_tmp, thumb_path)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise ValueError(f"not a readable image: {e}") from e
+    name = f"{digest}.{ext}"
+    target = os.path.join(directory, name)
+    if os.path.exists(target): os.remove(upload_path)  # duplicate upload, keep the stored copy
+    else: os.replace(upload_path, target)
+    return name, thumb_name
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None: _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _executor
+
+
+def shutdown():
+    if _executor is not None: _executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _too_large(limit: int) -> JSONResponse:
+    return JSONResponse({"detail": f"Upload larger than {limit / 2**20:.0f} MB."}, status_code=413, headers={"Connection": "close"})
+
+
+class UploadLimitMiddleware:
+    """Plain ASGI middleware capping request bodies per path before any form parsing happens.
+
+    A declared Content-Length over the limit is refused without reading the body. Otherwise bytes are
+    counted as they are received; past the limit the client gets a 413 and the app sees a disconnect,
+    so multipart parsing stops instead of spooling the rest of the upload.
+    """
+    def __init__(self, app, limits: dict[str, int]): self.app = app; self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None: return await self.app(scope, receive, send)
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > limit: return await _too_large(limit)(scope, receive, send)
+        state = {"received": 0, "refused": False}
+        async def limited_receive():
+            if state["refused"]: return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                state["received"] += len(message.get("body", b""))
+                if state["received"] > limit:
+                    state["refused"] = True
+                    await _too_large(limit)(scope, receive, send)
+                    return {"type": "http.disconnect"}
+            return message
+        async def guarded_send(message):
+            if not state["refused"]: await send(message)  # the app's reaction to the disconnect is dropped
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not state["refused"]: raise
+
+
+async def save_profile_picture(file: UploadFile, directory: str = IMAGE_DIR) -> tuple[str, str]:
+    """Copy an upload into the image directory under the size cap, then hash-name it and thumbnail it off the event loop.
+
+    The request body was already capped by UploadLimitMiddleware; the per-file check here is exact.
+
+    Returns the (image, thumbnail) URL paths under /images.
+    """
+    upload_path = os.path.join(directory, f".upload-{uuid.uuid4().hex}")
+    digest, size = hashlib.sha256(), 0
+    try:
+        async with await anyio.open_file(upload_path, "wb") as out:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > PROFILE_PIC_MAX_BYTES: raise HTTPException(status_code=413, detail=f"Image larger than {PROFILE_PIC_MAX_BYTES / 2**20:g} MB.")
+                digest.update(chunk); await out.write(chunk)
+        if size == 0: raise HTTPException(status_code=400, detail="Empty file.")
+        try:
+            name, thumb_name = await asyncio.get_running_loop().run_in_executor(_pool(), _process_image, upload_path, digest.hexdigest(), directory)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Unsupported image; upload a JPEG, PNG, GIF or WebP.")
+    finally:
+        if os.path.exists(upload_path): os.remove(upload_path)
+    return f"/images/{name}", f"/images/{thumb_name}"
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """StaticFiles with long-lived caching. Starlette already adds ETag/Last-Modified and answers
+    If-None-Match with 304; this adds Cache-Control so repeat avatar loads never reach the app."""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
@@ -0,0 +1,18 @@
+import asyncio
+from typing import Awaitable, Callable
+
+from logs import get_logger
+
+log = get_logger("jobs")
+
+
+async def periodic(name: str, seconds: float, job: Callable[[], Awaitable], run_first: bool = False):
+    """Run `job` every `seconds` for the life of the worker; an exception is logged as "<name>_failed" and the loop goes on.
+
+    With run_first the first run is immediate (jobs that warm an in-memory index), otherwise it waits one interval.
+    """
+    if not run_first: await asyncio.sleep(seconds)
+    while True:
+        try: await job()
+        except Exception as e: log.error(f"{name}_failed", error=str(e))
+        await asyncio.sleep(seconds)
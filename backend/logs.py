@@ -0,0 +1,54 @@
+import os
+import sys
+import random
+import logging
+from datetime import datetime, timezone
+
+from serialization import dumps
+
+# Root level for the app's loggers (DEBUG shows per-frame websocket events)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Share of DEBUG/INFO events kept; warnings and errors are never sampled out
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event, then the event's fields."""
+    def format(self, record: logging.LogRecord) -> str:
+        line = {"ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"), "level": record.levelname.lower(),
+                "logger": record.name, "event": record.getMessage(), **getattr(record, "fields", {})}
+        if record.exc_info: line["exc"] = self.formatException(record.exc_info)
+        return dumps(line).decode()
+
+
+def _configure() -> logging.Logger:
+    root = logging.getLogger("skillswap")
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout); handler.setFormatter(JSONFormatter())
+        root.addHandler(handler); root.setLevel(LOG_LEVEL); root.propagate = False
+    return root
+
+
+class EventLogger:
+    """Structured logger: log.info("ws_connected", client_id=...) emits {"event": "ws_connected", "client_id": ...}.
+
+    DEBUG and INFO events are kept with probability `sample_rate` (LOG_SAMPLE_RATE by default) and
+    carry the rate they were sampled at, so counts can be scaled back up.
+    """
+    def __init__(self, name: str, sample_rate: float = LOG_SAMPLE_RATE):
+        self._logger = _configure().getChild(name); self.sample_rate = sample_rate
+
+    def _log(self, level: int, event: str, fields: dict, exc_info=None):
+        if not self._logger.isEnabledFor(level): return
+        if level < logging.WARNING and self.sample_rate < 1:
+            if random.random() >= self.sample_rate: return
+            fields["sample_rate"] = self.sample_rate
+        self._logger.log(level, event, extra={"fields": fields}, exc_info=exc_info)
+
+    def debug(self, event: str, **fields): self._log(logging.DEBUG, event, fields)
+    def info(self, event: str, **fields): self._log(logging.INFO, event, fields)
+    def warning(self, event: str, **fields): self._log(logging.WARNING, event, fields)
+    def error(self, event: str, exc_info=None, **fields): self._log(logging.ERROR, event, fields, exc_info)
+
+
+def get_logger(name: str, sample_rate: float = LOG_SAMPLE_RATE) -> EventLogger: return EventLogger(name, sample_rate)
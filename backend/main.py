@@ -1,23 +1,34 @@
 import os
-import uuid
-import json
-import shutil
-from datetime import datetime, timedelta
+import asyncio
+from datetime import datetime, timezone
 from typing import Optional, List
 
-import jwt
 from bson import ObjectId
-from bson.errors import InvalidId
+from bson.errors import InvalidDocument, InvalidId
 from fastapi import (FastAPI, HTTPException, Depends, File, UploadFile,
-                     WebSocket, WebSocketDisconnect, Request)
+                     WebSocket, WebSocketDisconnect, Query, Request)
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.staticfiles import StaticFiles
 # from motor.motor_asyncio import AsyncIOMotorClient
-from passlib.context import CryptContext
 from pydantic import BaseModel, EmailStr, Field
-
-from auth import verify_token
+from pymongo import ReturnDocument
+
+from auth import verify_token, create_access_token, token_cache
+from connections import ConnectionManager
+from chat_writer import MessageWriter, unread_key, unread_count
+import skill_stats
+from market_cache import market_cache, MARKET_FIELDS
+from search import search_index, run_rebuilder
+from recommendations import recommender, run_refitter, USER_FIELDS
+from notification_retention import run_archiver
+from passwords import hash_password, verify_password, pool_stats
+import images
+from pagination import page_params, fetch_page, encode_cursor, NEXT_CURSOR_HEADER, MAX_PAGE_SIZE
+from serialization import MongoJSONResponse, page_response, with_id, loads
+from conditional import conditional_response
+from logs import get_logger
+from metrics import NOTIFICATIONS, HTTPMetricsMiddleware, register_stats, metrics_endpoint
+from outbox import NotificationDispatcher, notification_payload
 import skills
 
 
@@ -25,50 +36,48 @@ import skills
 app = FastAPI(title="SkillSwap API", version="0.1.0")
 app.include_router(skills.router)
 ALLOWED_ORIGINS = ["http://localhost:5173", "http://localhost:5174", "http://127.0.0.1:5173", "http://127.0.0.1:5174", "https://skill-swap266.vercel.app"]
-app.add_middleware(CORSMiddleware, allow_origins=ALLOWED_ORIGINS, allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
-app.mount("/images", StaticFiles(directory="static/images"), name="images")
+# Innermost, so the 413 still gets CORS headers
+app.add_middleware(images.UploadLimitMiddleware, limits={"/profile/picture": images.PROFILE_PIC_MAX_BYTES + images.MULTIPART_OVERHEAD})
+app.add_middleware(CORSMiddleware, allow_origins=ALLOWED_ORIGINS, allow_credentials=True, allow_methods=["*"], allow_headers=["*"], expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Last-Modified"])
+app.mount("/images", images.ImmutableStaticFiles(directory=images.IMAGE_DIR), name="images")
+app.add_middleware(HTTPMetricsMiddleware)
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+log = get_logger("api")
 
 # --- WebSocket Manager ---
-class ConnectionManager:
-    def __init__(self): self.active_connections: dict[str, WebSocket] = {}
-    async def connect(self, websocket: WebSocket, client_id: str): await websocket.accept(); self.active_connections[client_id] = websocket; print(f"--- WS CONNECTED: {client_id} ---")
-    def disconnect(self, client_id: str):
-        if client_id in self.active_connections: del self.active_connections[client_id]; print(f"--- WS DISCONNECTED: {client_id} ---")
-    async def broadcast(self, data: dict): message = json.dumps(data, default=str); [await conn.send_text(message) for conn in self.active_connections.values()]
-    async def send_personal_message(self, data: dict, client_id: str) -> bool:
-        """Send a personal websocket message. Returns True if sent, False otherwise."""
-        message = json.dumps(data, default=str) # Use default=str to handle ObjectId/datetime
-        if client_id in self.active_connections:
-            try:
-                await self.active_connections[client_id].send_text(message)
-                print(f"--- WS SENT to {client_id} ---")
-                return True
-            except Exception as e:
-                print(f"--- WS SEND ERROR to {client_id}: {e} ---")
-                return False
-        else:
-            print(f"--- WS SEND FAILED: {client_id} not connected ---")
-            return False
 manager = ConnectionManager()
 
 # ---------- DB & Auth Setup ----------
 
 
 
-from database import  db, users_collection, skills_collection, requests_collection, notifications_collection
+from database import users_collection, skills_collection, requests_collection, notifications_collection, messages_collection, ensure_indexes, run_in_transaction
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# NEW: Ensure we use the cloud messages collection
-messages_collection = db["messages"]
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# IMPORTANT: Ensure this matches what you used to create the token
-# If you put SECRET_KEY in .env, use os.getenv("SECRET_KEY")
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = "HS256"
+# Write-behind persistence for chat messages received over websockets
+message_writer = MessageWriter(messages_collection, requests_collection)
+# Notification outbox: handlers insert, the dispatcher sends and marks delivered in batches
+dispatcher = NotificationDispatcher(notifications_collection, manager)
+register_stats("ws", lambda: {**manager.stats, **manager.memory_stats()})
+register_stats("chat_writer", lambda: message_writer.stats)
+register_stats("dispatcher", lambda: dispatcher.stats)
+register_stats("market_cache", lambda: market_cache.stats)
+register_stats("password_pool", pool_stats)
+register_stats("token_cache", token_cache.stats)
+
+MARKET_PAGE_SIZE = 30
+MAX_OBJECT_ID = ObjectId("f" * 24)
+# Badge count stops at this many unread notifications ("99+"); ids accepted per bulk mark-read
+UNREAD_COUNT_CAP = 99
+MAX_MARK_READ = 500
+# Response shapes for list routes: projections fetch only what is returned, and docs go straight to orjson
+SKILL_OUT = {"title": "", "description": "", "category": "", "availability": "", "owner": "", "owner_email": ""}
+SKILL_OUT_FIELDS = dict.fromkeys(SKILL_OUT, 1)
+REQUEST_FIELDS = {"skill_id": 1, "from_user": 1, "to_user": 1, "message": 1, "status": 1, "created_at": 1}
+NOTIFICATION_FIELDS = {"type": 1, "request_id": 1, "from_user": 1, "to_user": 1, "skill_title": 1, "skill_id": 1, "message": 1, "status": 1, "delivered": 1, "read": 1, "created_at": 1}
+MESSAGE_FIELDS = {"request_id": 1, "from_user": 1, "to_user": 1, "content": 1, "timestamp": 1}
 
 # ---------- Schemas ----------
 class UserSignup(BaseModel): username: str; email: EmailStr; password: str
@@ -82,6 +91,7 @@ class SkillCreate(BaseModel): title: str = Field(..., min_length=2, max_length=8
 class SkillOut(BaseModel): id: str; title: str; description: str; category: str; availability: str; owner: str; owner_email: str
 class ExchangeRequest(BaseModel): skill_id: str; message: Optional[str] = ""
 class RequestResponse(BaseModel): action: str
+class MarkRead(BaseModel): ids: Optional[List[str]] = Field(None, max_length=MAX_MARK_READ)  # omitted: every unread notification
 class Message(BaseModel): id: str = Field(alias="_id"); request_id: str; from_user: str; to_user: str; content: str; timestamp: datetime
 # ✅ NEW: Schema for chat connection list
 class ChatConnection(BaseModel):
@@ -89,49 +99,66 @@ class ChatConnection(BaseModel):
     other_user: str
     skill_title: str
     last_message: Optional[str] = None
+    last_message_from: Optional[str] = None
+    last_activity_at: Optional[datetime] = None
+    unread_count: int = 0
 
 # ---------- WebSocket Endpoint ----------
+# Most undelivered notifications replayed to a socket on connect
+NOTIFICATION_REPLAY_LIMIT = int(os.getenv("NOTIFICATION_REPLAY_LIMIT", "50"))
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
-    await manager.connect(websocket, client_id)
-    # On connect, push any undelivered notifications for this user
+    conn = await manager.connect(websocket, client_id)
+    # On connect, push the oldest undelivered notifications in one frame and mark exactly those delivered.
+    # Anything past NOTIFICATION_REPLAY_LIMIT is left for the next connect or the paginated /notifications route.
     try:
-        cursor = notifications_collection.find({"to_user": client_id, "delivered": False})
-        async for notif in cursor:
-            # build message payload similar to live notifications
-            payload = {
-                "type": notif.get("type"),
-                "request_id": str(notif.get("request_id")) if notif.get("request_id") else None,
-                "from_user": notif.get("from_user"),
-                "skill_title": notif.get("skill_title"),
-                "skill_id": str(notif.get("skill_id")) if notif.get("skill_id") else None,
-                "message": notif.get("message", "")
-            }
-            sent_ok = await manager.send_personal_message(payload, client_id)
-            if sent_ok:
-                await notifications_collection.update_one({"_id": notif["_id"]}, {"$set": {"delivered": True}})
+        pending = await notifications_collection.find({"to_user": client_id, "delivered": False}).sort("created_at", 1).limit(NOTIFICATION_REPLAY_LIMIT + 1).to_list(length=NOTIFICATION_REPLAY_LIMIT + 1)
+        # Notifications the dispatcher is already sending (e.g. created while this socket connected) would arrive twice
+        batch = [n for n in pending[:NOTIFICATION_REPLAY_LIMIT] if not dispatcher.is_pending(n["_id"])]
+        if batch:
+            frame = {"type": "notification_batch", "notifications": [notification_payload(n) for n in batch], "has_more": len(pending) > NOTIFICATION_REPLAY_LIMIT, "more_url": "/notifications"}
+            if manager.send_to(conn, frame): # only the new socket; the user's other sockets were already live
+                dispatcher.mark_delivered([n["_id"] for n in batch])
+                NOTIFICATIONS.labels("replay", "delivered").inc(len(batch))
+            else: NOTIFICATIONS.labels("replay", "offline").inc(len(batch))
     except Exception as e:
-        print(f"Error sending pending notifications to {client_id}: {e}")
+        NOTIFICATIONS.labels("replay", "failed").inc(); log.error("notification_replay_failed", client_id=client_id, error=str(e))
     try:
         while True:
-            text_data = await websocket.receive_text()
-            data = json.loads(text_data)
+            text_data = await websocket.receive_text(); conn.touch() # any frame, heartbeat pongs included, keeps the socket alive
+            data = loads(text_data)
             if data.get("type") == "chat_message":
-                message_doc = {"request_id": ObjectId(data["request_id"]), "from_user": client_id, "to_user": data["to"], "content": data["content"], "timestamp": datetime.utcnow()}
-                await messages_collection.insert_one(message_doc)
-                message_doc["_id"] = str(message_doc["_id"]) # Convert ObjectId before sending
-                message_doc["request_id"] = str(message_doc["request_id"]) # Convert ObjectId before sending
-                await manager.send_personal_message(message_doc, data["to"])
-    except WebSocketDisconnect: manager.disconnect(client_id)
-    except Exception as e: print(f"WS Error {client_id}: {e}"); manager.disconnect(client_id)
+                message_doc = {"_id": ObjectId(), "request_id": ObjectId(data["request_id"]), "from_user": client_id, "to_user": data["to"], "content": data["content"], "timestamp": datetime.utcnow()}
+                # Buffered first so a message Mongo could never store is refused before anyone sees it; the insert is batched with the same _id
+                try: await message_writer.add(message_doc)
+                except InvalidDocument as e:
+                    manager.send_to(conn, {"type": "error", "detail": "Message could not be stored.", "request_id": data["request_id"]}); log.warning("ws_message_rejected", client_id=client_id, error=str(e))
+                    continue
+                await manager.send_personal_message({**message_doc, "_id": str(message_doc["_id"]), "request_id": data["request_id"]}, data["to"])
+    except WebSocketDisconnect: manager.disconnect(conn)
+    except Exception as e: log.warning("ws_receive_error", client_id=client_id, error=str(e)); manager.disconnect(conn)
 
 # ---------- Helper & Startup ----------
-def create_access_token(subject: str) -> str:
-    expire = datetime.utcnow() + timedelta(minutes=60); payload = {"sub": subject, "exp": expire}
-    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+async def skill_titles_for(docs: list, default: str) -> dict:
+    """Resolve skill titles for a page of request docs with one $in query instead of one find_one per doc."""
+    skill_ids = list({d["skill_id"] for d in docs if d.get("skill_id")})
+    titles = {s["_id"]: s["title"] async for s in skills_collection.find({"_id": {"$in": skill_ids}}, {"title": 1})} if skill_ids else {}
+    return {d["_id"]: titles.get(d.get("skill_id"), default) for d in docs}
+async def delta_cursor(request_id: ObjectId, after: str) -> str:
+    """Keyset cursor positioned at a chat message id (looked up for its timestamp) or just past an ISO timestamp."""
+    try:
+        anchor = await messages_collection.find_one({"_id": ObjectId(after), "request_id": request_id}, {"timestamp": 1})
+        if not anchor: raise HTTPException(status_code=400, detail="Unknown message id for after.")
+        return encode_cursor(anchor, "timestamp")
+    except InvalidId: pass
+    try: ts = datetime.fromisoformat(after.replace("Z", "+00:00"))
+    except ValueError: raise HTTPException(status_code=400, detail="after must be a message id or an ISO timestamp.")
+    if ts.tzinfo: ts = ts.astimezone(timezone.utc).replace(tzinfo=None) # stored timestamps are naive UTC
+    return encode_cursor({"timestamp": ts, "_id": MAX_OBJECT_ID}, "timestamp") # sorts after every message at exactly ts
 @app.on_event("startup")
-async def on_startup(): await users_collection.create_index("username", unique=True); await users_collection.create_index("email", unique=True)
-async def get_body(request: Request): return await request.body() # Debug helper
+async def on_startup(): await ensure_indexes(); await manager.start(); message_writer.start(); dispatcher.start(); asyncio.create_task(skill_stats.run_reconciler()); asyncio.create_task(run_rebuilder()); asyncio.create_task(run_refitter()); asyncio.create_task(run_archiver())
+@app.on_event("shutdown")
+async def on_shutdown(): await message_writer.stop(); await dispatcher.stop(); await manager.stop(); images.shutdown()
 
 # ---------- API Routes ----------
 @app.get("/")
@@ -145,123 +172,100 @@ async def request_exchange(payload: ExchangeRequest, username: str = Depends(ver
     if not skill: raise HTTPException(status_code=404, detail="Skill not found")
     if skill["owner"] == username: raise HTTPException(status_code=400, detail="You cannot request your own skill")
 
-    doc = { "skill_id": _id, "from_user": username, "to_user": skill["owner"], "message": payload.message, "status": "pending", "created_at": datetime.utcnow() }
-    result = await requests_collection.insert_one(doc) # Get the result of the insert operation
-
-    # Persist a notification record so recipient can fetch it if websocket delivery fails
+    now = datetime.utcnow()
+    doc = { "_id": ObjectId(), "skill_id": _id, "from_user": username, "to_user": skill["owner"], "message": payload.message, "status": "pending", "created_at": now, "last_activity_at": now }
+    # Notification record doubles as the outbox entry: the dispatcher delivers it after the response
     notif_doc = {
+        "_id": ObjectId(),
         "type": "new_request",
-        "request_id": result.inserted_id,
+        "request_id": doc["_id"],
         "from_user": username,
         "to_user": skill["owner"],
         "skill_title": skill["title"],
         "skill_id": skill["_id"],
         "message": payload.message,
-        "created_at": datetime.utcnow(),
-        "delivered": False
-    }
-    notif_res = await notifications_collection.insert_one(notif_doc)
-
-    notification_data = {
-        "type": "new_request",
-        "request_id": str(result.inserted_id), # Use the ID from the insert result
-        "from_user": username,
-        "skill_title": skill["title"],
-        "skill_id": str(skill["_id"]),
-        "message": payload.message
+        "created_at": now,
+        "delivered": False,
+        "read": False
     }
-
-    skill_owner_username = skill["owner"];
-    print(f"--- Attempting send NEW_REQUEST to {skill_owner_username} ---") # Debug print
-    sent = await manager.send_personal_message(notification_data, skill_owner_username)
-    if sent:
-        await notifications_collection.update_one({"_id": notif_res.inserted_id}, {"$set": {"delivered": True}})
+    # Request and outbox entry commit together, so the dispatcher never announces a request that was not stored
+    async def write(session):
+        await requests_collection.insert_one(doc, session=session)
+        await notifications_collection.insert_one(notif_doc, session=session)
+    await run_in_transaction(write)
+    dispatcher.notify(notif_doc)
     return {"message": "Request sent"}
 
 
 @app.put("/requests/{request_id}/respond")
-async def respond_to_request(request_id: str, response: RequestResponse, username: str = Depends(verify_token), body: bytes = Depends(get_body)):
-    print(f"--- DEBUG RESPOND BODY: {body} ---") # Keep for debugging if needed
+async def respond_to_request(request_id: str, response: RequestResponse, username: str = Depends(verify_token)):
+    log.debug("request_respond", request_id=request_id, action=response.action, user=username)
     try: object_id = ObjectId(request_id)
     except InvalidId: raise HTTPException(status_code=400, detail="Invalid request ID.")
     request = await requests_collection.find_one({"_id": object_id})
     if not request: raise HTTPException(status_code=404, detail="Request not found.")
     if request["to_user"] != username: raise HTTPException(status_code=403, detail="Not authorized.")
     new_status = response.action
-    await requests_collection.update_one({"_id": object_id}, {"$set": {"status": new_status}})
-    original_requester = request["from_user"]
-    skill_doc = await skills_collection.find_one({"_id": request["skill_id"]})
-    skill_title = skill_doc["title"] if skill_doc else "a deleted skill"
-    response_notification = {
-        "type": "request_response",
-        "request_id": request_id, # Include request ID in response notification
-        "skill_title": skill_title,
-        "status": new_status,
-        "from_user": username # Let requester know who responded
-    }
-    print(f"--- Attempting send RESPONSE to {original_requester} ---") # Debug print
-    # Persist a notification record for the response
+    skill_doc = await skills_collection.find_one({"_id": request["skill_id"]}, {"title": 1})
+    # Outbox entry for the requester; delivered by the dispatcher with the same payload shape as before
     resp_notif = {
+        "_id": ObjectId(),
         "type": "request_response",
         "request_id": object_id,
         "from_user": username,
-        "to_user": original_requester,
-        "skill_title": skill_title,
+        "to_user": request["from_user"],
+        "skill_title": skill_doc["title"] if skill_doc else "a deleted skill",
         "status": new_status,
         "created_at": datetime.utcnow(),
-        "delivered": False
+        "delivered": False,
+        "read": False
     }
-    resp_notif_res = await notifications_collection.insert_one(resp_notif)
-    sent = await manager.send_personal_message(response_notification, original_requester)
-    if sent:
-        await notifications_collection.update_one({"_id": resp_notif_res.inserted_id}, {"$set": {"delivered": True}})
+    async def write(session):
+        await requests_collection.update_one({"_id": object_id}, {"$set": {"status": new_status}}, session=session)
+        await notifications_collection.insert_one(resp_notif, session=session)
+    await run_in_transaction(write)
+    dispatcher.notify(resp_notif)
     return {"message": f"Request {new_status}"}
 
 
 @app.get("/requests/sent") # Make sure this line is exactly correct
-async def get_sent_requests(username: str = Depends(verify_token)):
-    cursor = requests_collection.find({"from_user": username}).sort("created_at", -1)
-    requests = []
-    async for req in cursor:
-        skill = await skills_collection.find_one({"_id": req["skill_id"]})
-        if skill:
-            req["skill_title"] = skill["title"]
-        else:
-            req["skill_title"] = "a deleted skill"
-        
-        # Convert ObjectId to string for JSON serialization
-        req["_id"] = str(req["_id"])
-        req["skill_id"] = str(req["skill_id"])
-        
-        requests.append(req)
-    return requests
+async def get_sent_requests(page: tuple = Depends(page_params), username: str = Depends(verify_token)):
+    requests, next_cursor = await fetch_page(requests_collection, {"from_user": username}, "created_at", *page, projection=REQUEST_FIELDS)
+    titles = await skill_titles_for(requests, "a deleted skill")
+    for req in requests: req["skill_title"] = titles[req["_id"]]
+    return page_response(requests, next_cursor)
 
 
 @app.get("/requests/received")
-async def get_received_requests(username: str = Depends(verify_token)):
-    cursor = requests_collection.find({"to_user": username}).sort("created_at", -1)
-    incoming = []
-    async for req in cursor:
-        # attach skill title if available
-        skill = await skills_collection.find_one({"_id": req["skill_id"]})
-        req["skill_title"] = skill["title"] if skill else "a deleted skill"
-        req["_id"] = str(req["_id"])
-        req["skill_id"] = str(req["skill_id"])
-        incoming.append(req)
-    return incoming
+async def get_received_requests(page: tuple = Depends(page_params), username: str = Depends(verify_token)):
+    incoming, next_cursor = await fetch_page(requests_collection, {"to_user": username}, "created_at", *page, projection=REQUEST_FIELDS)
+    # attach skill titles in one batched lookup
+    titles = await skill_titles_for(incoming, "a deleted skill")
+    for req in incoming: req["skill_title"] = titles[req["_id"]]
+    return page_response(incoming, next_cursor)
 
 
 @app.get("/notifications")
-async def get_notifications(username: str = Depends(verify_token)):
-    cursor = notifications_collection.find({"to_user": username}).sort("created_at", -1)
-    notifs = []
-    async for n in cursor:
-        n["_id"] = str(n["_id"])
-        # normalize request_id
-        if isinstance(n.get("request_id"), ObjectId):
-            n["request_id"] = str(n["request_id"]) 
-        notifs.append(n)
-    return notifs
+async def get_notifications(page: tuple = Depends(page_params), username: str = Depends(verify_token)):
+    notifs, next_cursor = await fetch_page(notifications_collection, {"to_user": username}, "created_at", *page, projection=NOTIFICATION_FIELDS)
+    return page_response(notifs, next_cursor) # ObjectIds (request_id, skill_id) serialize as strings
+
+
+@app.get("/notifications/unread_count")
+async def get_unread_count(username: str = Depends(verify_token)):
+    # Counted on the (to_user, read) index and capped, so badge polling stays cheap for users with a long backlog
+    count = await notifications_collection.count_documents({"to_user": username, "read": {"$ne": True}}, limit=UNREAD_COUNT_CAP + 1)
+    return {"unread": min(count, UNREAD_COUNT_CAP), "more": count > UNREAD_COUNT_CAP}
+
+
+@app.put("/notifications/read")
+async def mark_notifications_read(body: MarkRead, username: str = Depends(verify_token)):
+    query = {"to_user": username, "read": {"$ne": True}}
+    if body.ids is not None:
+        try: query["_id"] = {"$in": [ObjectId(i) for i in body.ids]}
+        except InvalidId: raise HTTPException(status_code=400, detail="Invalid notification id")
+    result = await notifications_collection.update_many(query, {"$set": {"read": True}})
+    return {"message": "marked", "updated": result.modified_count}
 
 
 @app.put("/notifications/{notif_id}/read")
@@ -270,12 +274,10 @@ async def mark_notification_read(notif_id: str, username: str = Depends(verify_t
         oid = ObjectId(notif_id)
     except InvalidId:
         raise HTTPException(status_code=400, detail="Invalid notification id")
-    notif = await notifications_collection.find_one({"_id": oid})
-    if not notif:
+    # Ownership is part of the filter: someone else's notification is reported as not found
+    result = await notifications_collection.update_one({"_id": oid, "to_user": username}, {"$set": {"read": True}})
+    if not result.matched_count:
         raise HTTPException(status_code=404, detail="Notification not found")
-    if notif.get("to_user") != username:
-        raise HTTPException(status_code=403, detail="Not authorized")
-    await notifications_collection.update_one({"_id": oid}, {"$set": {"read": True}})
     return {"message": "marked"}
 # ... (All other routes remain the same) ...
 # Remaining routes below are unchanged and correct
@@ -283,13 +285,13 @@ async def mark_notification_read(notif_id: str, username: str = Depends(verify_t
 async def signup(user: UserSignup):
     exists = await users_collection.find_one({"$or": [{"username": user.username}, {"email": user.email}]});
     if exists: raise HTTPException(status_code=400, detail="Username or email already exists")
-    hashed = pwd_context.hash(user.password); doc = {"username": user.username, "email": user.email, "password": hashed}; await users_collection.insert_one(doc)
+    hashed = await hash_password(user.password); doc = {"username": user.username, "email": user.email, "password": hashed, "updated_at": datetime.utcnow()}; await users_collection.insert_one(doc)
     return {"message": "User created successfully"}
 @app.post("/login")
 async def login(body: UserLogin):
     user = await users_collection.find_one({"username": body.username})
-    if not user or not pwd_context.verify(body.password, user["password"]): raise HTTPException(status_code=400, detail="Invalid username or password")
-    token = create_access_token(subject=user["username"])
+    if not user or not await verify_password(body.password, user["password"]): raise HTTPException(status_code=400, detail="Invalid username or password")
+    token = create_access_token(data={"sub": user["username"]})
     return {"message": "Login successful", "access_token": token, "token_type": "bearer"}
 @app.post("/skills", status_code=201)
 async def create_skill(skill: SkillCreate, username: str = Depends(verify_token)):
@@ -297,19 +299,20 @@ async def create_skill(skill: SkillCreate, username: str = Depends(verify_token)
     if not user: raise HTTPException(status_code=404, detail="User not found")
     doc = {"title": skill.title, "description": skill.description, "category": skill.category, "availability": skill.availability, "owner": username, "owner_email": user.get("email", ""), "status": "in_progress", "created_at": datetime.utcnow(), "updated_at": datetime.utcnow()}
     res = await skills_collection.insert_one(doc)
+    await skill_stats.on_skill_created(username, doc["title"], doc["status"]); market_cache.add({**doc, "_id": res.inserted_id}); search_index.add({**doc, "_id": res.inserted_id}); recommender.add_skill({**doc, "_id": res.inserted_id})
     new_skill_data = SkillOut(id=str(res.inserted_id), title=skill.title, description=skill.description, category=skill.category, availability=skill.availability, owner=username, owner_email=user.get("email", ""))
     await manager.broadcast({"type": "new_skill", "data": new_skill_data.dict()})
     return {"message": "Skill added", "id": str(res.inserted_id)}
 @app.get("/skills/market", response_model=List[SkillOut])
-async def skills_market(username: str = Depends(verify_token)):
-    cursor = skills_collection.find({"owner": {"$ne": username}}).sort("created_at", -1).limit(30)
-    items = [SkillOut(id=str(s["_id"]), title=s["title"], description=s["description"], category=s["category"], availability=s["availability"], owner=s["owner"], owner_email=s.get("owner_email", "")) async for s in cursor]
-    return items
+async def skills_market(cursor: Optional[str] = None, limit: int = Query(MARKET_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), username: str = Depends(verify_token)):
+    cached = await market_cache.feed(username, limit) if cursor is None else None # first page comes from the shared cache
+    docs, next_cursor = cached or await fetch_page(skills_collection, {"owner": {"$ne": username}}, "created_at", cursor, limit, projection=MARKET_FIELDS)
+    return page_response(with_id(docs, SKILL_OUT), next_cursor)
 @app.get("/skills/mine", response_model=List[SkillOut])
-async def my_skills(username: str = Depends(verify_token)):
-    cursor = skills_collection.find({"owner": username}).sort("updated_at", -1)
-    items = [SkillOut(id=str(s["_id"]), title=s["title"], description=s["description"], category=s["category"], availability=s["availability"], owner=s["owner"], owner_email=s.get("owner_email", "")) async for s in cursor]
-    return items
+async def my_skills(request: Request, username: str = Depends(verify_token)):
+    docs = await skills_collection.find({"owner": username}, {**SKILL_OUT_FIELDS, "updated_at": 1}).sort("updated_at", -1).to_list(length=None)
+    # Versioned by (id, updated_at) of every skill, so deletes change the ETag too; no Last-Modified since a delete leaves max(updated_at) unchanged
+    return conditional_response(request, with_id(docs, SKILL_OUT), [(d["_id"], d.get("updated_at")) for d in docs])
 @app.delete("/skills/{skill_id}", status_code=200)
 async def delete_skill(skill_id: str, username: str = Depends(verify_token)):
     try: object_id = ObjectId(skill_id)
@@ -317,95 +320,98 @@ async def delete_skill(skill_id: str, username: str = Depends(verify_token)):
     skill = await skills_collection.find_one({"_id": object_id});
     if not skill: raise HTTPException(status_code=404, detail="Skill not found.")
     if skill["owner"] != username: raise HTTPException(status_code=403, detail="Not authorized.")
-    await skills_collection.delete_one({"_id": object_id}); await requests_collection.delete_many({"skill_id": object_id})
+    await skills_collection.delete_one({"_id": object_id}); await requests_collection.delete_many({"skill_id": object_id}); await skill_stats.on_skill_deleted(username); market_cache.remove(object_id); search_index.remove(object_id); recommender.remove_skill(object_id)
     return {"message": "Skill deleted."}
 
 # ✅ NEW: Endpoint to get accepted connections for chat list
 @app.get("/chats/connections", response_model=List[ChatConnection])
 async def get_chat_connections(username: str = Depends(verify_token)):
+    # Find requests where the user is involved AND status is accepted, most recent activity first.
+    # Previews and unread counts live on the request doc (kept current by message_writer), and the
+    # skill title comes from a $lookup, so the whole list is a single round trip.
+    pipeline = [
+        {"$match": {"$or": [{"status": "accepted", "from_user": username}, {"status": "accepted", "to_user": username}]}},
+        {"$sort": {"last_activity_at": -1, "created_at": -1}},
+        {"$lookup": {"from": skills_collection.name, "localField": "skill_id", "foreignField": "_id", "as": "skill"}},
+        {"$project": {"from_user": 1, "to_user": 1, "last_message": 1, "last_message_from": 1, "last_activity_at": 1, "unread": 1, "skill.title": 1}},
+    ]
     connections = []
-    # Find requests where the user is involved AND status is accepted
-    query = {
-        "$and": [
-            {"status": "accepted"},
-            {"$or": [{"from_user": username}, {"to_user": username}]}
-        ]
-    }
-    cursor = requests_collection.find(query).sort("created_at", -1)
-
-    async for req in cursor:
+    async for req in requests_collection.aggregate(pipeline):
         other_user = req["to_user"] if req["from_user"] == username else req["from_user"]
-        skill = await skills_collection.find_one({"_id": req["skill_id"]})
-        skill_title = skill["title"] if skill else "Deleted Skill"
-
-        # Optional: Find the last message for a preview (can be added later)
-        # last_msg = await messages_collection.find_one({"request_id": req["_id"]}, sort=[("timestamp", -1)])
-        
-        connections.append(ChatConnection(
-            request_id=str(req["_id"]),
-            other_user=other_user,
-            skill_title=skill_title
-            # last_message=last_msg["content"] if last_msg else None
-        ))
-    return connections
+        connections.append({
+            "request_id": req["_id"],
+            "other_user": other_user,
+            "skill_title": req["skill"][0]["title"] if req["skill"] else "Deleted Skill",
+            "last_message": req.get("last_message"),
+            "last_message_from": req.get("last_message_from"),
+            "last_activity_at": req.get("last_activity_at"),
+            "unread_count": unread_count(req, username)
+        })
+    return MongoJSONResponse(connections)
 
 @app.get("/chat/{request_id}", response_model=List[Message])
-async def get_chat_history(request_id: str, username: str = Depends(verify_token)):
+async def get_chat_history(request: Request, request_id: str, page: tuple = Depends(page_params), after: Optional[str] = None, username: str = Depends(verify_token)):
     try: req_obj_id = ObjectId(request_id)
     except InvalidId: raise HTTPException(status_code=400, detail="Invalid request ID.")
     request_doc = await requests_collection.find_one({"_id": req_obj_id})
     if not request_doc or username not in [request_doc["from_user"], request_doc["to_user"]]: raise HTTPException(status_code=403, detail="Not authorized.")
-    cursor = messages_collection.find({"request_id": req_obj_id}).sort("timestamp", 1)
-    # Correctly convert ObjectId to str for response model
-    history = []
-    async for msg in cursor:
-        msg['_id'] = str(msg['_id'])
-        msg['request_id'] = str(msg['request_id'])
-        history.append(Message(**msg))
-    return history
+    if message_writer.pending: await message_writer.flush() # read-your-writes for messages still buffered in this worker
+    if page[0] is None and unread_count(request_doc, username): await requests_collection.update_one({"_id": req_obj_id}, {"$set": {unread_key(username): 0}}) # opening the chat reads it
+    if after is not None:
+        # Delta mode: up to `limit` messages newer than a message id or an ISO timestamp, oldest first.
+        # A full page means there may be more: ask again with after=<last id>.
+        page_docs, _ = await fetch_page(messages_collection, {"request_id": req_obj_id}, "timestamp", await delta_cursor(req_obj_id, after), page[1], direction=1, projection=MESSAGE_FIELDS)
+        return conditional_response(request, page_docs, ["after", after, [d["_id"] for d in page_docs]], page_docs[-1]["timestamp"] if page_docs else None)
+    # Pages walk backwards from the newest message; each page is returned oldest-first
+    page_docs, next_cursor = await fetch_page(messages_collection, {"request_id": req_obj_id}, "timestamp", *page, projection=MESSAGE_FIELDS)
+    # Messages are append-only, so a page is versioned by its newest and oldest ids
+    version = [page[0], len(page_docs), page_docs[0]["_id"], page_docs[-1]["_id"]] if page_docs else [page[0], 0]
+    return conditional_response(request, page_docs[::-1], version, page_docs[0]["timestamp"] if page_docs else None, next_cursor)
 @app.get("/profile")
-async def get_profile(username: str = Depends(verify_token)):
+async def get_profile(request: Request, username: str = Depends(verify_token)):
     user = await users_collection.find_one({"username": username}, {"_id": 0, "password": 0});
     if not user: raise HTTPException(status_code=404, detail="User not found")
-    return user
+    # Every profile write stamps updated_at; accounts older than that field are versioned by their content
+    return conditional_response(request, user, [username, user["updated_at"]] if user.get("updated_at") else user, user.get("updated_at"))
 @app.put("/profile")
 async def update_profile(update: ProfileUpdate, username: str = Depends(verify_token)):
-    await users_collection.update_one({"username": username}, {"$set": update.dict(exclude_none=True)})
+    await users_collection.update_one({"username": username}, {"$set": {**update.dict(exclude_none=True), "updated_at": datetime.utcnow()}})
     return {"message": "Profile updated successfully"}
 @app.post("/profile/picture")
 async def upload_profile_picture(file: UploadFile = File(...), username: str = Depends(verify_token)):
-    unique_filename = f"{uuid.uuid4()}{os.path.splitext(file.filename)[1]}"; file_path = os.path.join("static/images", unique_filename)
-    with open(file_path, "wb") as buffer: shutil.copyfileobj(file.file, buffer)
-    url_path = f"/images/{unique_filename}"; await users_collection.update_one({"username": username}, {"$set": {"profile_pic": url_path}})
-    return {"profile_pic_url": url_path}
+    url_path, thumb_path = await images.save_profile_picture(file) # size-capped (body capped by UploadLimitMiddleware), content-addressed
+    await users_collection.update_one({"username": username}, {"$set": {"profile_pic": url_path, "profile_thumb": thumb_path, "updated_at": datetime.utcnow()}})
+    return {"profile_pic_url": url_path, "profile_thumb_url": thumb_path}
 @app.put("/profile/interests")
 async def update_user_interests(interests_data: UserInterestsUpdate, username: str = Depends(verify_token)):
     update_data = interests_data.dict(exclude_unset=True);
     if not update_data: raise HTTPException(status_code=400, detail="No data provided.")
-    await users_collection.update_one({"username": username}, {"$set": update_data})
+    user = await users_collection.find_one_and_update({"username": username}, {"$set": {**update_data, "updated_at": datetime.utcnow()}}, projection=USER_FIELDS, return_document=ReturnDocument.AFTER)
+    if user: recommender.update_user(user)
     return {"message": "User interests and goals updated."}
 @app.put("/profile/privacy")
 async def update_privacy_settings(privacy_data: PrivacySettings, username: str = Depends(verify_token)):
     update_data = privacy_data.dict(exclude_unset=True);
     if not update_data: raise HTTPException(status_code=400, detail="No privacy data.")
-    await users_collection.update_one({"username": username}, {"$set": update_data})
+    await users_collection.update_one({"username": username}, {"$set": {**update_data, "updated_at": datetime.utcnow()}})
     return {"message": "Privacy settings updated."}
 @app.put("/profile/notifications")
 async def update_notification_settings(notification_data: NotificationSettings, username: str = Depends(verify_token)):
     update_payload = {f"notificationSettings.{key}": value for key, value in notification_data.dict().items()};
     if not update_payload: raise HTTPException(status_code=400, detail="No notification data.")
-    await users_collection.update_one({"username": username}, {"$set": update_payload})
+    await users_collection.update_one({"username": username}, {"$set": {**update_payload, "updated_at": datetime.utcnow()}})
     return {"message": "Notification settings updated."}
 @app.post("/account/change-password")
 async def change_password(password_data: PasswordChange, username: str = Depends(verify_token)):
     user = await users_collection.find_one({"username": username});
-    if not user or not pwd_context.verify(password_data.current_password, user["password"]): raise HTTPException(status_code=400, detail="Incorrect current password")
-    hashed_password = pwd_context.hash(password_data.new_password); await users_collection.update_one({"username": username}, {"$set": {"password": hashed_password}})
+    if not user or not await verify_password(password_data.current_password, user["password"]): raise HTTPException(status_code=400, detail="Incorrect current password")
+    hashed_password = await hash_password(password_data.new_password); await users_collection.update_one({"username": username}, {"$set": {"password": hashed_password, "updated_at": datetime.utcnow()}})
     return {"message": "Password updated successfully"}
 
     
 @app.get("/dashboard/summary")
 async def dashboard_summary(username: str = Depends(verify_token)):
-    total = await skills_collection.count_documents({"owner": username}); completed = await skills_collection.count_documents({"owner": username, "status": "completed"}); in_progress = await skills_collection.count_documents({"owner": username, "status": "in_progress"})
-    last = await skills_collection.find_one({"owner": username}, sort=[("updated_at", -1)]); last_title = last["title"] if last else None; suggest = "Try a new skill in 'Communication'!" if in_progress else "Start with a beginner-friendly skill."
+    stats = await skill_stats.get_stats(username); total, completed, in_progress, last_title = stats["all"], stats["completed"], stats["in_progress"], stats["last_active_skill"]
+    top = recommender.recommend(username, 1)
+    suggest = f"Try '{top[0]['title']}' with {top[0]['owner']}!" if top else "Try a new skill in 'Communication'!" if in_progress else "Start with a beginner-friendly skill."
     return {"username": username, "totals": {"all": total, "completed": completed, "in_progress": in_progress}, "last_active_skill": last_title, "ai_suggestion": suggest}
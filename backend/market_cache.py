@@ -0,0 +1,69 @@
+import os
+import time
+import asyncio
+from typing import Optional
+
+from database import skills_collection
+from pagination import encode_cursor
+
+# Most recent skills kept in memory for the first page of /skills/market
+MARKET_CACHE_SIZE = int(os.getenv("MARKET_CACHE_SIZE", "500"))
+# Full reload from Mongo after this many seconds; also bounds how stale skills added or deleted
+# through another worker can be, since only this worker's writes update the cache directly
+MARKET_CACHE_TTL = float(os.getenv("MARKET_CACHE_TTL", "30"))
+MARKET_FIELDS = {"title": 1, "description": 1, "category": 1, "availability": 1, "owner": 1, "owner_email": 1, "created_at": 1}
+
+
+class MarketFeedCache:
+    """Process-wide list of the newest skills in (created_at, _id) descending order.
+
+    Every user's first market page is served from it by dropping their own skills in memory, instead
+    of a {"owner": {"$ne": ...}} query per poll. Skill writes in this worker update it in place.
+    """
+
+    def __init__(self, collection, size: int = MARKET_CACHE_SIZE, ttl: float = MARKET_CACHE_TTL):
+        self.collection = collection; self.size = size; self.ttl = ttl
+        self._skills: list[dict] = []
+        self._complete = False  # True when the window holds every skill in the collection
+        self._loaded_at = float("-inf")
+        self._lock = asyncio.Lock()
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0}
+
+    async def _ensure_fresh(self):
+        if time.monotonic() - self._loaded_at < self.ttl: return
+        async with self._lock:
+            if time.monotonic() - self._loaded_at < self.ttl: return  # refreshed while we waited
+            self._skills = await self.collection.find({}, MARKET_FIELDS).sort([("created_at", -1), ("_id", -1)]).limit(self.size).to_list(length=self.size)
+            self._complete = len(self._skills) < self.size
+            self._loaded_at = time.monotonic(); self.stats["refreshes"] += 1
+
+    async def feed(self, username: str, limit: int) -> Optional[tuple[list, Optional[str]]]:
+        """First market page for `username` and its next cursor, or None if the cache cannot answer it."""
+        await self._ensure_fresh()
+        page = []
+        for skill in self._skills:
+            if skill["owner"] == username: continue
+            page.append(skill)
+            if len(page) > limit: break
+        if len(page) <= limit and not self._complete:
+            # The user owns most of the cached window; whether older skills exist is only known to Mongo
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return page[:limit], (encode_cursor(page[limit - 1], "created_at") if len(page) > limit else None)
+
+    def add(self, skill: dict):
+        if skill.get("created_at") is None: return
+        doc = {"_id": skill["_id"], **{k: skill.get(k) for k in MARKET_FIELDS}}
+        # Mongo keeps milliseconds; match it so cursors built from this doc line up with stored values
+        doc["created_at"] = doc["created_at"].replace(microsecond=doc["created_at"].microsecond // 1000 * 1000)
+        key = (doc["created_at"], doc["_id"])
+        index = next((i for i, s in enumerate(self._skills) if (s["created_at"], s["_id"]) < key), len(self._skills))
+        self._skills.insert(index, doc)
+        if len(self._skills) > self.size:
+            del self._skills[self.size:]; self._complete = False
+
+    def remove(self, skill_id): self._skills = [s for s in self._skills if s["_id"] != skill_id]
+
+
+market_cache = MarketFeedCache(skills_collection)
@@ -0,0 +1,95 @@
+import os
+import time
+from typing import Callable
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+from pymongo import monitoring
+from starlette.requests import Request
+from starlette.responses import Response
+
+# With several gunicorn workers, point this at an empty shared directory so /metrics aggregates all
+# of them (prometheus_client multiprocess mode); otherwise a scrape only sees the worker it hit
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+# When set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+HTTP_LATENCY = Histogram("skillswap_http_request_duration_seconds", "HTTP request latency by route template.", ["method", "route", "status"])
+MONGO_LATENCY = Histogram("skillswap_mongo_command_duration_seconds", "MongoDB command round trip by collection and command.", ["collection", "command"], buckets=FAST_BUCKETS)
+MONGO_FAILURES = Counter("skillswap_mongo_command_failures_total", "MongoDB commands that returned an error.", ["collection", "command"])
+WS_ACTIVE = Gauge("skillswap_ws_active_connections", "Open websockets held by this worker.", multiprocess_mode="livesum")
+WS_SEND_LATENCY = Histogram("skillswap_ws_send_duration_seconds", "Time to write one frame to a websocket.", buckets=FAST_BUCKETS)
+NOTIFICATIONS = Counter("skillswap_notifications_total", "Notification deliveries by type and outcome (delivered, offline, retry, failed).", ["type", "outcome"])
+NOTIFICATION_LAG = Histogram("skillswap_notification_delivery_lag_seconds", "Time from a notification's insert to its websocket send by the dispatcher.", buckets=FAST_BUCKETS + (5.0, 10.0, 30.0, 60.0))
+
+
+class HTTPMetricsMiddleware:
+    """Plain ASGI middleware timing HTTP requests, labelled with the matched route template, not the raw path."""
+    def __init__(self, app): self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http": return await self.app(scope, receive, send)
+        status = {"code": 500}
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start": status["code"] = message["status"]
+            await send(message)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_LATENCY.labels(scope["method"], getattr(route, "path", "unmatched"), str(status["code"])).observe(time.perf_counter() - start)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command monitoring: one histogram sample per command, keyed by collection and command name."""
+    def __init__(self): self._pending: dict = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        self._pending[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def _finish(self, event) -> tuple[str, str]:
+        return self._pending.pop((event.connection_id, event.request_id), ""), event.command_name
+
+    def succeeded(self, event):
+        MONGO_LATENCY.labels(*self._finish(event)).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        labels = self._finish(event)
+        MONGO_LATENCY.labels(*labels).observe(event.duration_micros / 1e6); MONGO_FAILURES.labels(*labels).inc()
+
+
+class StatsCollector:
+    """Exports the in-process stats dicts (connection manager, chat writer, caches, pools) as gauges."""
+    def __init__(self): self.sources: dict[str, Callable[[], dict]] = {}
+
+    def collect(self):
+        for name, source in self.sources.items():
+            family = GaugeMetricFamily(f"skillswap_{name}_stats", f"{name} counters from this worker.", labels=["stat"])
+            for key, value in source().items():
+                if isinstance(value, (int, float)): family.add_metric([key], value)
+            yield family
+
+
+stats_collector = StatsCollector()
+if not PROMETHEUS_MULTIPROC_DIR: REGISTRY.register(stats_collector)  # per-process values cannot be merged across workers
+
+
+def register_stats(name: str, source: Callable[[], dict]): stats_collector.sources[name] = source
+
+
+def render() -> tuple[bytes, str]:
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry(); MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}": return Response(status_code=401)
+    body, content_type = render()
+    return Response(body, media_type=content_type)
@@ -0,0 +1,53 @@
+import os
+import asyncio
+from datetime import datetime, timedelta
+
+from pymongo.errors import BulkWriteError
+
+from chat_writer import DUPLICATE_KEY
+from database import notifications_collection, notifications_archive_collection
+from jobs import periodic
+from logs import get_logger
+
+# Notifications older than this are moved to notifications_archive (which expires them after NOTIFICATION_ARCHIVE_TTL_DAYS)
+NOTIFICATION_RETENTION_DAYS = float(os.getenv("NOTIFICATION_RETENTION_DAYS", "90"))
+# How often the background job archives, and how many notifications it moves per round trip
+NOTIFICATION_ARCHIVE_SECONDS = int(os.getenv("NOTIFICATION_ARCHIVE_SECONDS", "3600"))
+NOTIFICATION_ARCHIVE_BATCH = 1000
+
+log = get_logger("notification_retention")
+
+
+async def _copy_to_archive(docs: list, archived_at: datetime):
+    try:
+        await notifications_archive_collection.insert_many([{**d, "archived_at": archived_at} for d in docs], ordered=False)
+    except BulkWriteError as e:
+        # Another worker archived some of the same batch; anything but a duplicate _id is a real failure
+        if any(err.get("code") != DUPLICATE_KEY for err in e.details.get("writeErrors", [])): raise
+
+
+async def archive_notifications(retention_days: float = NOTIFICATION_RETENTION_DAYS) -> int:
+    """Move notifications older than the retention window to the archive, oldest first. Returns how many were moved.
+
+    Each batch is copied before it is deleted, so an interrupted run leaves duplicates in the archive
+    (skipped on the next copy) rather than losing notifications.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    moved = 0
+    while True:
+        docs = await notifications_collection.find({"created_at": {"$lt": cutoff}}).sort("created_at", 1).limit(NOTIFICATION_ARCHIVE_BATCH).to_list(length=NOTIFICATION_ARCHIVE_BATCH)
+        if not docs: return moved
+        await _copy_to_archive(docs, datetime.utcnow())
+        await notifications_collection.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+        moved += len(docs)
+        if len(docs) < NOTIFICATION_ARCHIVE_BATCH: return moved
+
+
+async def _archive(): log.info("notifications_archived", notifications=await archive_notifications())
+
+
+async def run_archiver(): await periodic("notification_archive", NOTIFICATION_ARCHIVE_SECONDS, _archive)
+
+
+if __name__ == "__main__":
+    print(f"Archived {asyncio.run(archive_notifications())} notifications.")
@@ -0,0 +1,138 @@
+import os
+import asyncio
+from contextlib import suppress
+from functools import partial
+from datetime import datetime, timedelta
+from typing import Optional
+
+from batcher import Batcher
+from logs import get_logger
+from metrics import NOTIFICATIONS, NOTIFICATION_LAG
+
+# Delivered ids are marked with one update_many once this many are waiting...
+DISPATCH_FLUSH_SIZE = int(os.getenv("DISPATCH_FLUSH_SIZE", "100"))
+# ...or once the oldest has waited this many seconds
+DISPATCH_FLUSH_INTERVAL = float(os.getenv("DISPATCH_FLUSH_INTERVAL", "0.05"))
+# Send attempts per notification before leaving it for replay on the recipient's next connect
+DISPATCH_MAX_ATTEMPTS = int(os.getenv("DISPATCH_MAX_ATTEMPTS", "5"))
+DISPATCH_BACKOFF_BASE = float(os.getenv("DISPATCH_BACKOFF_BASE", "0.5"))
+# Undelivered notifications created since their recipient connected here, and older than DISPATCH_SWEEP_GRACE,
+# are re-dispatched this often; covers a worker that died between the insert and the send
+DISPATCH_SWEEP_SECONDS = float(os.getenv("DISPATCH_SWEEP_SECONDS", "30"))
+DISPATCH_SWEEP_GRACE = float(os.getenv("DISPATCH_SWEEP_GRACE", "10"))
+DISPATCH_SWEEP_LIMIT = 500
+
+log = get_logger("outbox")
+
+
+def notification_payload(notif: dict) -> dict:
+    """Websocket payload for a stored notification, same shape as the live ones."""
+    payload = {
+        "type": notif.get("type"),
+        "request_id": str(notif.get("request_id")) if notif.get("request_id") else None,
+        "from_user": notif.get("from_user"),
+        "skill_title": notif.get("skill_title"),
+        "skill_id": str(notif.get("skill_id")) if notif.get("skill_id") else None,
+        "message": notif.get("message", "")
+    }
+    if "status" in notif: payload["status"] = notif["status"]
+    return payload
+
+
+class NotificationDispatcher(Batcher):
+    """Delivers stored notifications (the outbox) to websockets off the request path.
+
+    Handlers only insert the notification with delivered=False and hand it to notify(). The
+    dispatcher sends it (through the backplane when the recipient is on another worker), marks
+    sent ones delivered in batched update_many calls, and retries failed sends with exponential
+    backoff. A recipient who is offline is not retried: replay on connect picks the notification up.
+    The batched buffer holds the delivered ids waiting to be marked.
+    """
+
+    def __init__(self, collection, manager, flush_size: int = DISPATCH_FLUSH_SIZE, flush_interval: float = DISPATCH_FLUSH_INTERVAL):
+        super().__init__(flush_size, flush_interval)
+        self.collection = collection; self.manager = manager
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        self._in_flight: set = set()  # ids queued or waiting on a retry, so the sweep does not double-send them
+        self.stats = {"sent": 0, "offline": 0, "retried": 0, "failed": 0, "swept": 0, "marked": 0}
+
+    def start(self):
+        super().start(); self._tasks = [asyncio.create_task(self._dispatch()), asyncio.create_task(self._sweeper())]
+
+    async def stop(self):
+        for task in self._tasks: task.cancel()
+        for task in self._tasks:
+            with suppress(asyncio.CancelledError): await task
+        await super().stop()
+
+    def notify(self, notif: dict, attempt: int = 1):
+        self._in_flight.add(notif["_id"]); self._queue.put_nowait((notif, attempt))
+
+    def is_pending(self, notif_id) -> bool:
+        """True while this dispatcher is sending the notification, or has sent it and not yet marked it delivered."""
+        return notif_id in self._in_flight or notif_id in self._buffer
+
+    def mark_delivered(self, ids: list):
+        """Queue ids for the next batched update (also used by replay on connect)."""
+        self._append(ids)
+
+    async def _dispatch(self):
+        while True:
+            notif, attempt = await self._queue.get()
+            kind = notif.get("type") or "unknown"
+            try:
+                await self.manager.notify(notification_payload(notif), notif["to_user"], partial(self._settled, notif, kind))
+            except Exception as e:
+                self._retry(notif, attempt, kind, e)
+
+    def _settled(self, notif: dict, kind: str, sent: bool):
+        """Called by the connection manager once the notification was queued on a socket (sent) or could not be."""
+        self._in_flight.discard(notif["_id"])
+        if sent:
+            self.stats["sent"] += 1; NOTIFICATIONS.labels(kind, "delivered").inc()
+            NOTIFICATION_LAG.observe(max(0.0, (datetime.utcnow() - notif["created_at"]).total_seconds()))
+            self.mark_delivered([notif["_id"]])
+        else:
+            self.stats["offline"] += 1; NOTIFICATIONS.labels(kind, "offline").inc()
+
+    def _retry(self, notif: dict, attempt: int, kind: str, error: Exception):
+        if attempt >= DISPATCH_MAX_ATTEMPTS:
+            self._in_flight.discard(notif["_id"]); self.stats["failed"] += 1; NOTIFICATIONS.labels(kind, "failed").inc()
+            log.error("notification_dispatch_failed", notification_id=notif["_id"], to_user=notif["to_user"], attempts=attempt, error=str(error))
+            return
+        delay = DISPATCH_BACKOFF_BASE * 2 ** (attempt - 1)
+        self.stats["retried"] += 1; NOTIFICATIONS.labels(kind, "retry").inc()
+        log.warning("notification_dispatch_retry", notification_id=notif["_id"], attempt=attempt, delay=delay, error=str(error))
+        asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, (notif, attempt + 1))
+
+    async def write(self, batch: list):
+        await self.collection.update_many({"_id": {"$in": batch}}, {"$set": {"delivered": True}})  # idempotent, so safe to retry
+        self.stats["marked"] += len(batch)
+
+    def write_failed(self, batch: list, error: Exception):
+        log.warning("notification_mark_failed", notifications=len(batch), error=str(error))
+
+    async def _sweeper(self):
+        while True:
+            await asyncio.sleep(DISPATCH_SWEEP_SECONDS)
+            try: await self.sweep()
+            except Exception as e: log.error("notification_sweep_failed", error=str(e))
+
+    async def sweep(self, grace: Optional[float] = None) -> int:
+        """Re-dispatch undelivered notifications created while their recipient was connected to this worker.
+
+        Older ones are left alone: replay on connect sent up to its limit and the rest is for the paginated
+        /notifications route, so only sends lost after connecting (e.g. a worker dying mid-dispatch) are retried.
+        """
+        since = self.manager.connected_since()
+        if not since: return 0
+        cutoff = datetime.utcnow() - timedelta(seconds=DISPATCH_SWEEP_GRACE if grace is None else grace)
+        branches = [{"to_user": user, "delivered": False, "created_at": {"$gte": connected, "$lt": cutoff}} for user, connected in since.items() if connected < cutoff]
+        if not branches: return 0
+        count = 0
+        async for notif in self.collection.find({"$or": branches}).sort("created_at", 1).limit(DISPATCH_SWEEP_LIMIT):
+            if self.is_pending(notif["_id"]): continue
+            self.notify(notif); count += 1
+        self.stats["swept"] += count
+        return count
@@ -0,0 +1,59 @@
+import os
+import json
+import base64
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Query
+
+# Page size used when the client does not pass ?limit=, and the hard upper bound for it
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "200"))
+# Response header carrying the continuation token (list bodies stay plain JSON arrays)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(doc: dict, field: str) -> str:
+    """Opaque continuation token for the (field, _id) position of the last doc on a page."""
+    value = doc.get(field)
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else None, str(doc["_id"])])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple[Optional[datetime], ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        value, oid = json.loads(raw)
+        return (datetime.fromisoformat(value) if value else None), ObjectId(oid)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_filter(query: dict, field: str, cursor: Optional[str], direction: int = -1) -> dict:
+    """Restrict `query` to documents strictly after the cursor position in (field, _id) order."""
+    if not cursor: return query
+    value, oid = decode_cursor(cursor)
+    op = "$lt" if direction < 0 else "$gt"
+    if value is None:
+        after = {field: None, "_id": {op: oid}}
+    else:
+        after = {"$or": [{field: {op: value}}, {field: value, "_id": {op: oid}}]}
+    return {"$and": [query, after]} if query else after
+
+
+def page_params(cursor: Optional[str] = None, limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)) -> tuple[Optional[str], int]:
+    """FastAPI dependency for ?cursor=&limit= on paginated list routes."""
+    return cursor, limit
+
+
+async def fetch_page(collection, query: dict, field: str, cursor: Optional[str], limit: int, direction: int = -1, projection: Optional[dict] = None) -> tuple[list, Optional[str]]:
+    """Fetch one keyset page sorted on (field, _id). Returns the docs and the next cursor (None on the last page)."""
+    docs = await collection.find(keyset_filter(query, field, cursor, direction), projection).sort([(field, direction), ("_id", direction)]).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1], field) if len(docs) > limit else None
+    return docs[:limit], next_cursor
+
+
+def set_next_cursor(response, next_cursor: Optional[str]) -> None:
+    if next_cursor: response.headers[NEXT_CURSOR_HEADER] = next_cursor
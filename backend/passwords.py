@@ -0,0 +1,42 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+# bcrypt releases the GIL, so a thread pool is enough to keep it off the event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hash/verify calls allowed in flight (running + queued) before new ones are turned away with a 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_stats = {"in_flight": 0, "completed": 0, "failed": 0, "rejected": 0}
+
+
+async def _run(fn, *args):
+    if _stats["in_flight"] >= PASSWORD_HASH_MAX_PENDING:
+        _stats["rejected"] += 1
+        raise HTTPException(status_code=503, detail="Server busy, please try again.")
+    _stats["in_flight"] += 1
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    except Exception:
+        _stats["failed"] += 1
+        raise
+    finally:
+        _stats["in_flight"] -= 1
+    _stats["completed"] += 1  # cancelled calls (client gone) count as neither
+    return result
+
+
+async def hash_password(password: str) -> str: return await _run(pwd_context.hash, password)
+async def verify_password(password: str, hashed: str) -> bool: return await _run(pwd_context.verify, password, hashed)
+
+
+def pool_stats() -> dict:
+    """Snapshot of the hashing pool: calls running, calls waiting for a thread, and totals by outcome."""
+    in_flight = _stats["in_flight"]
+    return {"workers": PASSWORD_HASH_WORKERS, "in_flight": in_flight, "queued": max(0, in_flight - PASSWORD_HASH_WORKERS), "completed": _stats["completed"], "failed": _stats["failed"], "rejected": _stats["rejected"]}
+
@@ -0,0 +1,246 @@
+import os
+import math
+import asyncio
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+from scipy.sparse import csr_matrix, diags, vstack
+
+from database import users_collection, skills_collection
+from search import tokenize
+from jobs import periodic
+from logs import get_logger
+
+# Recommendations precomputed and kept per user
+RECOMMENDATION_TOP_K = int(os.getenv("RECOMMENDATION_TOP_K", "10"))
+# Full refit interval (vocabulary, idf and every user's top-k); incremental updates fill the gaps
+RECOMMENDATION_REFIT_SECONDS = int(os.getenv("RECOMMENDATION_REFIT_SECONDS", "900"))
+# Terms in more than this share of skills (and over MAX_DF_MIN_SKILLS of them) are left out of the
+# vocabulary: near-universal words carry almost no idf weight but make every user match every skill
+RECOMMENDATION_MAX_DF = float(os.getenv("RECOMMENDATION_MAX_DF", "0.5"))
+MAX_DF_MIN_SKILLS = 50
+# Score cells (users x skills) densified at once during a batch top-k; ~64 MiB of float32
+SCORE_CELLS = 1 << 24
+USER_FIELDS = {"username": 1, "learningGoals": 1, "interests": 1, "hobbies": 1}
+SKILL_FIELDS = {"title": 1, "category": 1, "description": 1, "owner": 1}
+
+log = get_logger("recommendations")
+
+
+def user_tokens(user: dict) -> list[str]:
+    """What a user wants to learn or is into, as tokens."""
+    return [t for field in ("learningGoals", "interests", "hobbies") for item in (user.get(field) or []) for t in tokenize(item)]
+
+
+def skill_tokens(skill: dict) -> list[str]:
+    return tokenize(skill.get("title")) * 2 + tokenize(skill.get("category")) * 2 + tokenize(skill.get("description"))
+
+
+class RecommendationEngine:
+    """Matches users' learning goals, interests and hobbies against skills others offer.
+
+    Users and skills are L2-normalised sparse TF-IDF vectors over the skill vocabulary, so a score is a
+    cosine similarity. fit() scores every user against every skill with chunked sparse products and keeps
+    each user's top-k; profile edits and new or deleted skills then update only the affected users.
+    """
+
+    def __init__(self, top_k: int = RECOMMENDATION_TOP_K):
+        self.top_k = top_k
+        self.vocab: dict[str, int] = {}
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.skills: list[dict] = []                       # row -> {id, title, category, owner}
+        self.skill_rows: dict = {}                         # skill ObjectId -> row
+        self.skill_matrix = csr_matrix((0, 0), dtype=np.float32)
+        self._extra_skills: list[csr_matrix] = []          # rows added since the last vstack
+        self.alive = np.zeros(0, dtype=bool)
+        self.skill_owner = np.zeros(0, dtype=np.int64)     # row -> owner code
+        self.owner_codes: dict[str, int] = {}
+        self.user_matrix = csr_matrix((0, 0), dtype=np.float32)  # one row per user with goals, as of fit()
+        self.user_names: list[str] = []                    # user_matrix row -> username
+        self._user_rows: dict[str, int] = {}
+        self.user_edits: dict[str, csr_matrix] = {}        # users re-embedded since fit(); their fitted row is stale
+        self.top: dict[str, list[tuple[int, float]]] = {}  # username -> [(skill row, score)] best first
+        self.holders: dict[int, set] = {}                  # skill row -> usernames whose top-k holds it
+        self.floor = np.zeros(0, dtype=np.float32)         # user_matrix row -> score a new skill must beat
+        self.dropped: set[str] = set()                     # terms left out of the vocabulary by RECOMMENDATION_MAX_DF
+        self.waiting: dict[str, set] = {}                  # term no skill had yet -> usernames who want it
+        self.waiting_tokens: dict[str, list[str]] = {}     # those users' tokens, to re-embed them once a skill has the term
+        self._skills_t_cache: Optional[csr_matrix] = None
+        self._replay: Optional[list] = None
+
+    # ---------- vectors ----------
+    def _owner_code(self, username: str) -> int: return self.owner_codes.setdefault(username, len(self.owner_codes))
+
+    def _vectorize(self, token_lists: list[list[str]]) -> csr_matrix:
+        indptr, indices, data = [0], [], []
+        for tokens in token_lists:
+            for term, count in Counter(t for t in tokens if t in self.vocab).items():
+                col = self.vocab[term]; indices.append(col); data.append((1 + math.log(count)) * self.idf[col])
+            indptr.append(len(indices))
+        matrix = csr_matrix((np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)), shape=(len(token_lists), len(self.vocab)))
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        return (diags(np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)) @ matrix).tocsr()
+
+    def _add_terms(self, terms: set[str]):
+        """Give terms first seen on a new skill a column (idf as if in one skill) until the next fit() recounts them."""
+        n = max(len(self.skills), 1)
+        for term in sorted(terms): self.vocab[term] = len(self.vocab)
+        self.idf = np.append(self.idf, np.full(len(terms), math.log((1 + n) / 2) + 1, dtype=np.float32))
+        for matrix in (self.skill_matrix, self.user_matrix, *self._extra_skills, *self.user_edits.values()): matrix.resize((matrix.shape[0], len(self.vocab)))
+        self._skills_t_cache = None
+
+    def _wait_for_terms(self, username: str, tokens: list[str]):
+        """Remember which of a user's terms no skill has yet, so a skill that brings one can re-embed them."""
+        unknown = {t for t in tokens if t not in self.vocab and t not in self.dropped}
+        if unknown: self.waiting_tokens[username] = tokens
+        else: self.waiting_tokens.pop(username, None)
+        for term in unknown: self.waiting.setdefault(term, set()).add(username)
+
+    def _skills_t(self) -> csr_matrix:
+        if self._extra_skills:
+            self.skill_matrix = vstack([self.skill_matrix, *self._extra_skills], format="csr"); self._extra_skills = []; self._skills_t_cache = None
+        if self._skills_t_cache is None: self._skills_t_cache = self.skill_matrix.T.tocsr()
+        return self._skills_t_cache
+
+    def _set_top(self, username: str, recs: list[tuple[int, float]]):
+        for row, _ in self.top.get(username, ()): self.holders.get(row, set()).discard(username)
+        if recs: self.top[username] = recs
+        else: self.top.pop(username, None)
+        for row, _ in recs: self.holders.setdefault(row, set()).add(username)
+        index = self._user_rows.get(username)
+        if index is not None and username not in self.user_edits: self.floor[index] = recs[-1][1] if len(recs) >= self.top_k else 0.0
+
+    def _score_users(self, matrix: csr_matrix, usernames: list[str]):
+        """Top-k for each row of `matrix` (the vector of usernames[i]), a dense block of users at a time."""
+        if not usernames: return
+        skills_t = self._skills_t()
+        k = min(self.top_k, skills_t.shape[1])
+        chunk = max(1, SCORE_CELLS // max(skills_t.shape[1], 1))
+        codes = np.array([self.owner_codes.get(u, -1) for u in usernames], dtype=np.int64)
+        for start in range(0, len(usernames), chunk):
+            names = usernames[start:start + chunk]
+            if k == 0:
+                for username in names: self._set_top(username, [])
+                continue
+            scores = (matrix[start:start + chunk] @ skills_t).toarray()
+            scores[:, ~self.alive] = 0; scores[self.skill_owner[None, :] == codes[start:start + chunk, None]] = 0
+            best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(scores, best, axis=1)
+            order = np.argsort(-best_scores, axis=1, kind="stable")
+            best, best_scores = np.take_along_axis(best, order, axis=1).tolist(), np.take_along_axis(best_scores, order, axis=1).tolist()
+            for i, username in enumerate(names):
+                self._set_top(username, [(row, score) for row, score in zip(best[i], best_scores[i]) if score > 0])
+
+    def _vector(self, username: str) -> Optional[csr_matrix]:
+        if username in self.user_edits: return self.user_edits[username]
+        row = self._user_rows.get(username)
+        return None if row is None else self.user_matrix[row]
+
+    def _rescore(self, usernames: list[str]):
+        vectors = [(u, v) for u in usernames if (v := self._vector(u)) is not None]
+        if vectors: self._score_users(vstack([v for _, v in vectors], format="csr"), [u for u, _ in vectors])
+
+    # ---------- full fit ----------
+    def fit(self, users: list[dict], skills: list[dict]):
+        """Rebuild vocabulary, idf, all vectors and every user's top-k. CPU bound; run it off the event loop."""
+        skill_token_lists = [skill_tokens(s) for s in skills]
+        df = Counter(t for tokens in skill_token_lists for t in set(tokens))
+        n = max(len(skills), 1)
+        cutoff = max(RECOMMENDATION_MAX_DF * n, MAX_DF_MIN_SKILLS)
+        self.vocab = {term: i for i, term in enumerate(t for t, count in df.items() if count <= cutoff)}
+        self.dropped = {t for t, count in df.items() if count > cutoff}
+        self.idf = np.array([math.log((1 + n) / (1 + df[t])) + 1 for t in self.vocab], dtype=np.float32)
+        self.skills = [{"id": str(s["_id"]), "title": s.get("title"), "category": s.get("category"), "owner": s.get("owner")} for s in skills]
+        self.skill_rows = {s["_id"]: i for i, s in enumerate(skills)}
+        self.skill_matrix = self._vectorize(skill_token_lists); self._extra_skills = []; self._skills_t_cache = None
+        self.alive = np.ones(len(skills), dtype=bool)
+        self.owner_codes = {}
+        self.skill_owner = np.array([self._owner_code(s.get("owner")) for s in skills], dtype=np.int64)
+        users = [u for u in users if user_tokens(u)]
+        self.user_matrix = self._vectorize([user_tokens(u) for u in users])
+        self.user_names = [u["username"] for u in users]
+        self.waiting, self.waiting_tokens = {}, {}
+        for u in users: self._wait_for_terms(u["username"], user_tokens(u))
+        self._user_rows = {name: i for i, name in enumerate(self.user_names)}; self.user_edits = {}
+        self.top, self.holders, self.floor = {}, {}, np.zeros(len(users), dtype=np.float32)
+        self._score_users(self.user_matrix, self.user_names)
+
+    # ---------- incremental ----------
+    def update_user(self, user: dict):
+        """A user's goals/interests changed: re-embed them and recompute just their top-k."""
+        if self._replay is not None: self._replay.append(("update_user", user))
+        username = user["username"]
+        tokens = user_tokens(user)
+        self._wait_for_terms(username, tokens)
+        vector = self._vectorize([tokens]) if tokens else csr_matrix((1, len(self.vocab)), dtype=np.float32)
+        self.user_edits[username] = vector
+        if username in self._user_rows: self.floor[self._user_rows[username]] = np.inf  # add_skill scores edited users separately
+        if vector.nnz: self._score_users(vector, [username])
+        else: self._set_top(username, [])
+
+    def add_skill(self, skill: dict):
+        """Add a skill; terms the last fit() never saw join the vocabulary, so users interested in them match it now, not after the next refit."""
+        if self._replay is not None: self._replay.append(("add_skill", skill))
+        if skill["_id"] in self.skill_rows: return
+        row = len(self.skills)
+        tokens = skill_tokens(skill)
+        new_terms = {t for t in tokens if t not in self.vocab and t not in self.dropped}
+        if new_terms: self._add_terms(new_terms)
+        vector = self._vectorize([tokens])
+        self.skills.append({"id": str(skill["_id"]), "title": skill.get("title"), "category": skill.get("category"), "owner": skill.get("owner")})
+        self.skill_rows[skill["_id"]] = row; self._extra_skills.append(vector)
+        self.alive = np.append(self.alive, True)
+        owner = self._owner_code(skill.get("owner")); self.skill_owner = np.append(self.skill_owner, owner)
+        if vector.nnz: self._offer_skill(row, vector, owner)
+        # Users who wanted a term this skill brought get re-embedded with it: their norm changes, so all of their top-k is rescored
+        waiting = {u for term in new_terms for u in self.waiting.pop(term, ())}
+        for username in sorted(waiting):
+            tokens = self.waiting_tokens.get(username)
+            if tokens is None: continue
+            self._wait_for_terms(username, tokens)
+            edited = self._vectorize([tokens]); self.user_edits[username] = edited
+            if username in self._user_rows: self.floor[self._user_rows[username]] = np.inf
+            self._score_users(edited, [username])
+
+    def _offer_skill(self, row: int, vector: csr_matrix, owner: int):
+        """Score one new skill against every user (one sparse mat-vec) and slot it into the top-k lists it beats."""
+        scores = (self.user_matrix @ vector.T).toarray().ravel()
+        candidates = [(self.user_names[i], float(scores[i])) for i in np.flatnonzero(scores > self.floor).tolist()]
+        candidates += [(username, float(edited.multiply(vector).sum())) for username, edited in self.user_edits.items()]
+        for username, score in candidates:
+            if score <= 0 or self.owner_codes.get(username) == owner: continue
+            current = self.top.get(username, [])
+            if len(current) < self.top_k or score > current[-1][1]:
+                self._set_top(username, sorted(current + [(row, score)], key=lambda item: -item[1])[:self.top_k])
+
+    def remove_skill(self, skill_id):
+        if self._replay is not None: self._replay.append(("remove_skill", skill_id))
+        row = self.skill_rows.pop(skill_id, None)
+        if row is None: return
+        self.alive[row] = False
+        self._rescore(list(self.holders.pop(row, ())))
+
+    def recommend(self, username: str, limit: Optional[int] = None) -> list[dict]:
+        return [{**self.skills[row], "score": round(score, 4)} for row, score in self.top.get(username, [])[:limit or self.top_k] if self.alive[row]]
+
+    async def refit(self):
+        users = await users_collection.find({}, USER_FIELDS).to_list(length=None)
+        skills = await skills_collection.find({}, SKILL_FIELDS).to_list(length=None)
+        fresh = RecommendationEngine(self.top_k)
+        self._replay = []
+        try:
+            await asyncio.to_thread(fresh.fit, users, skills)
+        finally:
+            replay, self._replay = self._replay, None
+        for method, arg in replay: getattr(fresh, method)(arg)  # writes that landed while fitting
+        self.__dict__.update(fresh.__dict__)
+
+
+recommender = RecommendationEngine()
+
+
+async def _refit(): await recommender.refit(); log.info("recommendations_fitted", users=len(recommender.top), skills=len(recommender.skills))
+
+
+async def run_refitter(): await periodic("recommendations_fit", RECOMMENDATION_REFIT_SECONDS, _refit, run_first=True)
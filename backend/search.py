@@ -0,0 +1,155 @@
+import os
+import re
+import math
+import bisect
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+
+from database import skills_collection
+from jobs import periodic
+from logs import get_logger
+
+# Full rebuild interval; picks up skills created or deleted through other workers
+SEARCH_REBUILD_SECONDS = int(os.getenv("SEARCH_REBUILD_SECONDS", "300"))
+# Field weights applied to term frequencies
+FIELD_WEIGHTS = {"title": 3.0, "category": 2.0, "description": 1.0}
+SEARCH_FIELDS = {"title": 1, "description": 1, "category": 1, "availability": 1, "owner": 1, "owner_email": 1}
+BM25_K1, BM25_B = 1.2, 0.75
+MIN_PREFIX, MAX_EXPANSIONS, PREFIX_DISCOUNT = 2, 50, 0.7
+STOPWORDS = {"a", "an", "and", "the", "of", "to", "in", "for", "on", "with", "is", "at", "by", "or"}
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+log = get_logger("search")
+
+
+def tokenize(text: Optional[str]) -> list[str]:
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+class SkillSearchIndex:
+    """In-memory inverted index over skill title, description and category with BM25 ranking.
+
+    Each query token matches its exact term and, from MIN_PREFIX characters on, up to MAX_EXPANSIONS
+    vocabulary terms it prefixes (found by bisecting the sorted vocabulary), at a discount.
+
+    Postings are kept in dicts for cheap incremental updates, keyed by a dense int row per skill rather than
+    the ObjectId (whose hash is Python code). Queries score through numpy arrays of each term's postings,
+    built on the term's first query after it changed, so a search costs a few array ops per matched term
+    instead of Python work per posting, and the total and facets still cover every match.
+    """
+
+    def __init__(self):
+        self.postings: dict[str, dict] = {}  # term -> {row: weighted tf}
+        self.vocabulary: list[str] = []      # sorted terms, for prefix expansion
+        self.docs: dict = {}                 # skill_id -> stored result fields
+        self.rows: dict = {}                 # skill_id -> row; rows of removed skills stay unused until the next build()
+        self.row_ids: list = []              # row -> skill_id (None once removed)
+        self.lengths = np.zeros(0)           # row -> weighted doc length
+        self.category = np.zeros(0, dtype=np.int64)  # row -> category code
+        self.category_codes: dict = {}       # category -> code
+        self._total_length = 0.0
+        self._arrays: dict[str, tuple] = {}  # term -> (rows, tfs) arrays, dropped when the term's postings change
+        self._replay: Optional[list] = None  # writes seen while build() runs, re-applied after the swap
+
+    def __len__(self): return len(self.docs)
+
+    def add(self, skill: dict):
+        if self._replay is not None: self._replay.append(("_add", skill))
+        self._add(skill)
+
+    def remove(self, skill_id):
+        if self._replay is not None: self._replay.append(("_remove", skill_id))
+        self._remove(skill_id)
+
+    def _add(self, skill: dict):
+        skill_id = skill["_id"]
+        if skill_id in self.docs: self._remove(skill_id)
+        weights = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(skill.get(field)): weights[term] += weight
+        row = self.rows[skill_id] = len(self.row_ids); self.row_ids.append(skill_id)
+        if row >= len(self.lengths):  # grow by doubling
+            self.lengths = np.resize(self.lengths, max(16, 2 * row)); self.category = np.resize(self.category, len(self.lengths))
+        for term, tf in weights.items():
+            if term not in self.postings:
+                self.postings[term] = {}; bisect.insort(self.vocabulary, term)
+            self.postings[term][row] = tf; self._arrays.pop(term, None)
+        self.docs[skill_id] = {k: skill.get(k) for k in SEARCH_FIELDS}
+        self.lengths[row] = sum(weights.values()); self._total_length += self.lengths[row]
+        self.category[row] = self.category_codes.setdefault(skill.get("category"), len(self.category_codes))
+
+    def _remove(self, skill_id):
+        doc = self.docs.pop(skill_id, None)
+        if doc is None: return
+        row = self.rows.pop(skill_id); self.row_ids[row] = None
+        self._total_length -= self.lengths[row]; self.lengths[row] = 0
+        for field in FIELD_WEIGHTS:
+            for term in set(tokenize(doc.get(field))):
+                postings = self.postings.get(term)
+                if postings is None: continue
+                postings.pop(row, None); self._arrays.pop(term, None)
+                if not postings:
+                    del self.postings[term]; del self.vocabulary[bisect.bisect_left(self.vocabulary, term)]
+
+    def _expand(self, token: str) -> list[tuple[str, float]]:
+        terms = [(token, 1.0)] if token in self.postings else []
+        if len(token) >= MIN_PREFIX:
+            start = bisect.bisect_left(self.vocabulary, token)
+            for term in self.vocabulary[start:start + MAX_EXPANSIONS + 1]:
+                if not term.startswith(token): break
+                if term != token: terms.append((term, PREFIX_DISCOUNT))
+        return terms
+
+    def _term_arrays(self, term: str) -> tuple:
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self.postings[term]
+            arrays = self._arrays[term] = (np.fromiter(postings.keys(), np.int64, len(postings)), np.fromiter(postings.values(), np.float64, len(postings)))
+        return arrays
+
+    def search(self, query: str, category: Optional[str] = None, limit: int = 20) -> dict:
+        n = len(self.docs)
+        scores = np.zeros(len(self.row_ids))
+        if n:
+            avg_length = self._total_length / n
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[:len(self.row_ids)] / avg_length)
+            for token in set(tokenize(query)):
+                for term, boost in self._expand(token):
+                    rows, tfs = self._term_arrays(term)
+                    idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+                    scores[rows] += boost * idf * tfs * (BM25_K1 + 1) / (tfs + norm[rows])  # rows are unique within a term
+        matches = np.flatnonzero(scores)  # every BM25 term contributes > 0
+        # Facets describe the whole match set, before the category filter narrows it
+        counts = np.bincount(self.category[matches], minlength=len(self.category_codes))
+        names = list(self.category_codes)
+        facets = sorted(((names[code], int(count)) for code, count in enumerate(counts) if count), key=lambda item: -item[1])
+        if category is not None: matches = matches[self.category[matches] == self.category_codes.get(category, -1)]
+        total = len(matches)
+        if total > limit: matches = matches[np.argpartition(-scores[matches], limit - 1)[:limit]]
+        top = matches[np.argsort(-scores[matches], kind="stable")]
+        return {
+            "total": total,
+            "results": [{"id": str(self.row_ids[row]), **self.docs[self.row_ids[row]], "score": round(float(scores[row]), 4)} for row in top.tolist()],
+            "facets": {"category": dict(facets)},
+        }
+
+    async def build(self, collection=skills_collection):
+        fresh = SkillSearchIndex()
+        self._replay = []
+        try:
+            async for skill in collection.find({}, SEARCH_FIELDS): fresh._add(skill)
+        finally:
+            replay, self._replay = self._replay, None
+        for method, arg in replay: getattr(fresh, method)(arg)
+        self.__dict__.update(fresh.__dict__)  # swap in one step so queries never see a half-built index
+
+
+search_index = SkillSearchIndex()
+
+
+async def _rebuild(): await search_index.build(); log.info("search_index_built", skills=len(search_index))
+
+
+async def run_rebuilder(): await periodic("search_index_build", SEARCH_REBUILD_SECONDS, _rebuild, run_first=True)
@@ -0,0 +1,42 @@
+from typing import Any, Iterable, Optional
+
+import orjson
+from bson import ObjectId
+from fastapi import Response
+
+from pagination import set_next_cursor
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId): return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    """Mongo documents straight to JSON bytes: ObjectId as its hex string, datetime as ISO 8601 (orjson native)."""
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def dumps_text(obj: Any) -> str: return dumps(obj).decode()  # websocket text frames
+
+
+loads = orjson.loads
+
+
+def with_id(docs: Iterable[dict], fields: dict) -> list[dict]:
+    """Reshape projected docs for a response: `_id` becomes `id`, then `fields` (name -> default) in order."""
+    return [{"id": doc["_id"], **{name: doc.get(name, default) for name, default in fields.items()}} for doc in docs]
+
+
+class MongoJSONResponse(Response):
+    """Returned directly from routes, so FastAPI skips re-validating through the response_model
+    (which stays on the route for the OpenAPI schema)."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes: return dumps(content)
+
+
+def page_response(docs: list, next_cursor: Optional[str]) -> MongoJSONResponse:
+    # Headers set on an injected `response: Response` are dropped when a route returns its own Response
+    response = MongoJSONResponse(docs); set_next_cursor(response, next_cursor)
+    return response
@@ -0,0 +1,78 @@
+import os
+import asyncio
+
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+from database import db, skills_collection
+from jobs import periodic
+from logs import get_logger
+
+# One document per owner: {_id: owner, all, completed, in_progress, last_active_skill}
+skill_stats_collection = db["skill_stats"]
+# How often the background job rebuilds every owner's counters from the skills collection
+SKILL_STATS_RECONCILE_SECONDS = int(os.getenv("SKILL_STATS_RECONCILE_SECONDS", "3600"))
+STATUSES = ("completed", "in_progress")
+
+log = get_logger("skill_stats")
+
+
+def _status_sum(status: str) -> dict: return {"$sum": {"$cond": [{"$eq": ["$status", status]}, 1, 0]}}
+
+
+async def compute_stats(owner: str) -> dict:
+    """Counts and most recently updated title for one owner, in a single $facet round trip."""
+    pipeline = [
+        {"$match": {"owner": owner}},
+        {"$facet": {
+            "counts": [{"$group": {"_id": None, "all": {"$sum": 1}, **{s: _status_sum(s) for s in STATUSES}}}],
+            "last": [{"$sort": {"updated_at": -1}}, {"$limit": 1}, {"$project": {"_id": 0, "title": 1}}],
+        }},
+    ]
+    result = (await skills_collection.aggregate(pipeline).to_list(length=1))[0]
+    counts = result["counts"][0] if result["counts"] else {}
+    return {"all": counts.get("all", 0), **{s: counts.get(s, 0) for s in STATUSES}, "last_active_skill": result["last"][0]["title"] if result["last"] else None}
+
+
+async def get_stats(owner: str) -> dict:
+    """O(1) read of the maintained counters, computed (and stored) on first use."""
+    doc = await skill_stats_collection.find_one({"_id": owner}, {"_id": 0, "reconcile_run": 0})
+    if doc is not None: return doc
+    stats = await compute_stats(owner)
+    await skill_stats_collection.replace_one({"_id": owner}, stats, upsert=True)
+    return stats
+
+
+async def on_skill_created(owner: str, title: str, status: str | None):
+    inc = {"all": 1, **({status: 1} if status in STATUSES else {})}
+    # No upsert: an owner without a counters doc gets a full compute on the next get_stats
+    await skill_stats_collection.update_one({"_id": owner}, {"$inc": inc, "$set": {"last_active_skill": title}})
+
+
+async def on_skill_deleted(owner: str):
+    # The deleted skill may have been the last active one, so recompute rather than decrement
+    await skill_stats_collection.replace_one({"_id": owner}, await compute_stats(owner), upsert=True)
+
+
+async def reconcile_skill_stats() -> int:
+    """Rebuild every owner's counters from the skills collection, repairing any drift. Returns owners written."""
+    pipeline = [
+        {"$sort": {"updated_at": -1}},
+        {"$group": {"_id": "$owner", "all": {"$sum": 1}, **{s: _status_sum(s) for s in STATUSES}, "last_active_skill": {"$first": "$title"}}},
+    ]
+    run = ObjectId()  # exact-match stamp for this run
+    ops = [ReplaceOne({"_id": d["_id"]}, {**d, "reconcile_run": run}, upsert=True) async for d in skills_collection.aggregate(pipeline, allowDiskUse=True)]
+    if ops: await skill_stats_collection.bulk_write(ops, ordered=False)
+    # Owners not written by this run have no skills left; they fall back to a lazy compute
+    await skill_stats_collection.delete_many({"reconcile_run": {"$ne": run}})
+    return len(ops)
+
+
+async def _reconcile(): log.info("skill_stats_reconciled", owners=await reconcile_skill_stats())
+
+
+async def run_reconciler(): await periodic("skill_stats_reconcile", SKILL_STATS_RECONCILE_SECONDS, _reconcile)
+
+
+if __name__ == "__main__":
+    print(f"Reconciled skill stats for {asyncio.run(reconcile_skill_stats())} owners.")
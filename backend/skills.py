@@ -1,7 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from auth import verify_token
 # This connects this file to your cloud connection in database.py
 from database import skills_collection 
+import skill_stats
+from market_cache import market_cache
+from search import search_index
+from recommendations import recommender
+from serialization import MongoJSONResponse
 from datetime import datetime
 
 router = APIRouter()
@@ -13,11 +19,16 @@ async def add_skill(skill: dict, username: str = Depends(verify_token)):
         skill_entry = {
             "owner": username, 
             **skill, 
-            "created_at": datetime.utcnow()
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
         }
         
         # Save directly to the 'skills' folder in your Cloud Cluster
         result = await skills_collection.insert_one(skill_entry)
+        await skill_stats.on_skill_created(username, skill_entry.get("title"), skill_entry.get("status"))
+        market_cache.add(skill_entry)
+        search_index.add(skill_entry)
+        recommender.add_skill(skill_entry)
         
         return {
             "message": "Skill added successfully to Atlas Cloud", 
@@ -33,10 +44,17 @@ async def get_skills():
         cursor = skills_collection.find({})
         skills = await cursor.to_list(length=100)
         
-        # Convert the internal IDs so the website can read them
-        for s in skills:
-            s["_id"] = str(s["_id"])
-            
-        return {"skills": skills}
+        # ObjectIds and datetimes are encoded by the shared orjson serializer
+        return MongoJSONResponse({"skills": skills})
     except Exception as e:
-        raise HTTPException(status_code=500, detail="Cloud retrieval failed")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Cloud retrieval failed")
+
+@router.get("/skills/search")
+async def search_skills(q: str = Query(..., min_length=1, max_length=100), category: Optional[str] = None, limit: int = Query(20, ge=1, le=100), username: str = Depends(verify_token)):
+    # Served from the in-memory index built at startup (search.py), no regex scan in Mongo
+    return search_index.search(q, category, limit)
+
+@router.get("/recommendations")
+async def get_recommendations(limit: int = Query(10, ge=1, le=50), username: str = Depends(verify_token)):
+    # Precomputed top-k from the TF-IDF matcher (recommendations.py), kept current on profile and skill writes
+    return {"recommendations": recommender.recommend(username, limit)}
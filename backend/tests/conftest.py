@@ -0,0 +1,14 @@
+"""Tests run the app in-process against the in-memory Mongo fake (database.py's SKILLSWAP_ALLOW_LOCAL_DB opt-in).
+
+    cd backend && pip install -r tests/requirements.txt
+    python -m pytest tests
+"""
+import os
+import sys
+
+os.environ.setdefault("MONGO_URL", "mongomock://skillswap")
+os.environ.setdefault("SKILLSWAP_ALLOW_LOCAL_DB", "1")
+os.environ.setdefault("SECRET_KEY", "offline-test-secret-key-0123456789abcdef")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("WS_BACKPLANE", "local")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
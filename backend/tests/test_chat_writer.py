@@ -0,0 +1,53 @@
+"""A chat message Mongo can never store is refused or dropped; it must not wedge the writer for everyone else."""
+import asyncio
+
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+import main
+from auth import create_access_token
+from chat_writer import MessageWriter
+from database import db
+
+POISON_CONTENT = '18446744073709551615'  # valid JSON, parsed by orjson, but past BSON's 8-byte ints
+
+
+class FailingCollection:
+    def __init__(self): self.calls = 0
+    async def insert_many(self, batch, ordered=True): self.calls += 1; raise ConnectionError("mongo down")
+
+
+def test_poison_message_is_refused_and_chat_keeps_flowing():
+    request_id = ObjectId()
+    asyncio.run(db.requests.insert_one({"_id": request_id, "from_user": "alice", "to_user": "bob", "status": "accepted"}))
+    with TestClient(main.app) as client, client.websocket_connect("/ws/alice") as ws:
+        for content in (POISON_CONTENT, '{"a\\u0000b": 1}', '"hello"'):
+            ws.send_text(f'{{"type": "chat_message", "request_id": "{request_id}", "to": "bob", "content": {content}}}')
+        assert [ws.receive_json()["type"] for _ in range(2)] == ["error", "error"]
+        history = client.get(f"/chat/{request_id}", headers={"Authorization": f"Bearer {create_access_token({'sub': 'alice'})}"}).json()
+    assert [m["content"] for m in history] == ["hello"]
+    assert main.message_writer.stats["failed_batches"] == 0 and main.message_writer.failures == 0
+
+
+def test_unstorable_documents_in_a_batch_are_dropped():
+    async def run():
+        writer = MessageWriter(db.poison_messages)
+        good = {"_id": ObjectId(), "request_id": ObjectId(), "to_user": "bob", "content": "fine"}
+        writer._append([{"_id": ObjectId(), "content": 2 ** 64 - 1}, good])  # bypasses add()'s check
+        await writer.flush()
+        assert writer.pending == 0 and writer.failures == 0
+        assert writer.stats["dropped"] == 1 and writer.stats["written"] == 1
+        assert [d["content"] async for d in db.poison_messages.find()] == ["fine"]
+    asyncio.run(run())
+
+
+def test_failed_flushes_back_off():
+    async def run():
+        collection = FailingCollection()
+        writer = MessageWriter(collection, flush_interval=0.05); writer.start()
+        await writer.add({"content": "queued"})
+        await asyncio.sleep(0.5)
+        writer._task.cancel()
+        # 0.1 + 0.2 + 0.4 s between retries instead of one attempt per wakeup
+        assert 2 <= collection.calls <= 5 and writer.pending == 1
+    asyncio.run(run())
@@ -0,0 +1,62 @@
+"""Conditional GETs answer 304 while the client's copy is current, and ?after= returns only newer chat messages."""
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+import main
+from auth import create_access_token
+from database import db
+
+
+def headers(user: str, **extra) -> dict: return {"Authorization": f"Bearer {create_access_token({'sub': user})}", **extra}
+
+
+def seed_chat(messages: int) -> tuple[ObjectId, list]:
+    request_id, start = ObjectId(), datetime.utcnow() - timedelta(minutes=10)
+    docs = [{"_id": ObjectId(), "request_id": request_id, "from_user": "erin", "to_user": "finn", "content": f"m{i}", "timestamp": start + timedelta(seconds=i)} for i in range(messages)]
+    async def insert():
+        await db.requests.insert_one({"_id": request_id, "from_user": "erin", "to_user": "finn", "status": "accepted"})
+        await db.messages.insert_many(docs)
+    asyncio.run(insert())
+    return request_id, docs
+
+
+def test_chat_history_revalidates_with_etag():
+    request_id, docs = seed_chat(3)
+    client = TestClient(main.app)
+    first = client.get(f"/chat/{request_id}", headers=headers("erin"))
+    assert first.status_code == 200 and [m["content"] for m in first.json()] == ["m0", "m1", "m2"]
+    etag = first.headers["ETag"]
+    cached = client.get(f"/chat/{request_id}", headers=headers("erin", **{"If-None-Match": etag}))
+    assert cached.status_code == 304 and cached.content == b"" and cached.headers["ETag"] == etag
+    asyncio.run(db.messages.insert_one({"request_id": request_id, "from_user": "finn", "to_user": "erin", "content": "m3", "timestamp": datetime.utcnow()}))
+    changed = client.get(f"/chat/{request_id}", headers=headers("erin", **{"If-None-Match": etag}))
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag and changed.json()[-1]["content"] == "m3"
+
+
+def test_after_returns_only_newer_messages():
+    request_id, docs = seed_chat(5)
+    client = TestClient(main.app)
+    def after(value, **params): return client.get(f"/chat/{request_id}", params={"after": value, **params}, headers=headers("finn"))
+    assert [m["content"] for m in after(str(docs[1]["_id"])).json()] == ["m2", "m3", "m4"]
+    assert [m["content"] for m in after(str(docs[1]["_id"]), limit=2).json()] == ["m2", "m3"]
+    assert [m["content"] for m in after(docs[2]["timestamp"].isoformat() + "Z").json()] == ["m3", "m4"]
+    assert after(str(docs[4]["_id"])).json() == []
+    assert after(str(ObjectId())).status_code == 400 and after("last tuesday").status_code == 400
+    caught_up = after(str(docs[4]["_id"]))
+    assert client.get(f"/chat/{request_id}", params={"after": str(docs[4]["_id"])}, headers=headers("finn", **{"If-None-Match": caught_up.headers["ETag"]})).status_code == 304
+
+
+def test_profile_is_not_modified_until_it_is_updated():
+    asyncio.run(db.users.insert_one({"username": "gale", "email": "gale@example.com", "password": "x", "bio": "hi", "updated_at": datetime.utcnow() - timedelta(days=1)}))
+    client = TestClient(main.app)
+    first = client.get("/profile", headers=headers("gale"))
+    assert first.status_code == 200 and "Last-Modified" in first.headers
+    etag = first.headers["ETag"]
+    assert client.get("/profile", headers=headers("gale", **{"If-None-Match": etag})).status_code == 304
+    assert client.get("/profile", headers=headers("gale", **{"If-Modified-Since": first.headers["Last-Modified"]})).status_code == 304
+    assert client.put("/profile", json={"bio": "updated"}, headers=headers("gale")).status_code == 200
+    updated = client.get("/profile", headers=headers("gale", **{"If-None-Match": etag}))
+    assert updated.status_code == 200 and updated.json()["bio"] == "updated"
@@ -0,0 +1,49 @@
+"""Keyset cursors round-trip, bad ones are a 400, and following X-Next-Cursor walks a list exactly once."""
+import asyncio
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+from auth import create_access_token
+from database import db
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+
+
+def headers(user: str) -> dict: return {"Authorization": f"Bearer {create_access_token({'sub': user})}"}
+
+
+def b64(raw: bytes) -> str: return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("value", [datetime(2024, 5, 1, 12, 30, 15, 250000), None])
+def test_cursor_round_trip(value):
+    doc = {"_id": ObjectId(), "created_at": value}
+    assert decode_cursor(encode_cursor(doc, "created_at")) == (value, doc["_id"])
+
+
+@pytest.mark.parametrize("token", ["not base64 !!", b64(b"{}"), b64(b'["2024-05-01T12:00:00", "not-an-id"]'), b64(b'["yesterday", "0123456789abcdef01234567"]'), b64(b"[1, 2, 3]")])
+def test_bad_cursors_are_rejected(token):
+    with pytest.raises(HTTPException) as raised: decode_cursor(token)
+    assert raised.value.status_code == 400
+
+
+def test_following_next_cursor_visits_every_notification_once():
+    now = datetime.utcnow()
+    # Pairs share a created_at, so pages only stay disjoint if the _id tie-break works
+    docs = [{"_id": ObjectId(), "to_user": "dana", "type": "new_request", "message": str(i), "read": False, "created_at": now - timedelta(seconds=i // 2)} for i in range(7)]
+    asyncio.run(db.notifications.insert_many(docs))
+    client, seen, cursor = TestClient(main.app), [], None
+    while True:
+        response = client.get("/notifications", params={"limit": 2, **({"cursor": cursor} if cursor else {})}, headers=headers("dana"))
+        assert response.status_code == 200 and len(response.json()) <= 2
+        seen += [n["message"] for n in response.json()]
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor: break
+    expected = sorted(docs, key=lambda d: (d["created_at"], d["_id"]), reverse=True)
+    assert seen == [d["message"] for d in expected]
+    assert client.get("/notifications", params={"cursor": "garbage"}, headers=headers("dana")).status_code == 400
@@ -0,0 +1,19 @@
+"""The hashing pool counts only calls that returned as completed."""
+import asyncio
+
+import pytest
+
+import passwords
+
+
+def test_failures_and_cancellations_are_not_completed():
+    async def run():
+        before = passwords.pool_stats()
+        assert await passwords.verify_password("secret", await passwords.hash_password("secret"))
+        with pytest.raises(ValueError): await passwords.verify_password("secret", "not a bcrypt hash")
+        call = asyncio.create_task(passwords.hash_password("secret")); await asyncio.sleep(0)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError): await call
+        after = passwords.pool_stats()
+        assert after["completed"] - before["completed"] == 2 and after["failed"] - before["failed"] == 1 and after["in_flight"] == 0
+    asyncio.run(run())
@@ -0,0 +1,27 @@
+"""A skill bringing a term the last fit() never saw is recommended right away, not after the next refit."""
+from bson import ObjectId
+
+from recommendations import RecommendationEngine
+
+
+def skill(title: str, owner: str = "bob") -> dict: return {"_id": ObjectId(), "title": title, "category": "Tech", "owner": owner}
+
+
+def titles(engine: RecommendationEngine, username: str) -> list: return [r["title"] for r in engine.recommend(username)]
+
+
+def test_new_terms_join_the_vocabulary():
+    users = [{"username": "alice", "interests": ["python", "cooking"]}, {"username": "carol", "learningGoals": ["rust"]}]
+    engine = RecommendationEngine(3)
+    engine.fit(users, [skill("Italian cooking")])
+    assert "python" not in engine.vocab
+    python = skill("Python programming")
+    engine.add_skill(python)
+    engine.update_user({"username": "dave", "interests": ["haskell"]})
+    haskell = skill("Haskell for fun")
+    engine.add_skill(haskell)
+    assert titles(engine, "alice") == ["Italian cooking", "Python programming"]
+    assert titles(engine, "dave") == ["Haskell for fun"] and titles(engine, "carol") == []
+    fresh = RecommendationEngine(3)
+    fresh.fit(users + [{"username": "dave", "interests": ["haskell"]}], [skill("Italian cooking"), python, haskell])
+    assert all(titles(engine, u) == titles(fresh, u) for u in ("alice", "carol", "dave"))
@@ -0,0 +1,80 @@
+"""The request and chat lists resolve skill titles with a constant number of queries, whatever the page size."""
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+import main
+from auth import create_access_token
+from database import db
+
+COLLECTIONS = ("skills_collection", "requests_collection")
+QUERY_METHODS = ("find", "find_one", "aggregate", "count_documents")
+
+
+class CountingCollection:
+    """Stand-in for a Motor collection that counts read commands and delegates everything to the fake."""
+    def __init__(self, collection, counts: Counter):
+        self._collection = collection; self._counts = counts
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in QUERY_METHODS: return attr
+        def counted(*args, **kwargs):
+            self._counts[(self._collection.name, name)] += 1
+            return attr(*args, **kwargs)
+        return counted
+
+
+@pytest.fixture
+def counts(monkeypatch):
+    counts = Counter()
+    for name in COLLECTIONS: monkeypatch.setattr(main, name, CountingCollection(getattr(main, name), counts))
+    return counts
+
+
+def seed(requests: int, status: str):
+    """`requests` requests from alice to bob, each on its own skill."""
+    async def insert():
+        for name in ("skills", "requests"): await db[name].delete_many({})
+        now = datetime.utcnow()
+        skills = [{"_id": ObjectId(), "title": f"Skill {i}", "owner": "bob", "created_at": now, "updated_at": now} for i in range(requests)]
+        await db.skills.insert_many(skills)
+        await db.requests.insert_many([{"skill_id": s["_id"], "from_user": "alice", "to_user": "bob", "message": "", "status": status,
+                                        "created_at": now - timedelta(seconds=i), "last_activity_at": now - timedelta(seconds=i)} for i, s in enumerate(skills)])
+    asyncio.run(insert())
+
+
+def get(path: str, user: str) -> list:
+    response = TestClient(main.app).get(path, headers={"Authorization": f"Bearer {create_access_token({'sub': user})}"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def skill_queries(counts: Counter) -> int: return sum(n for (collection, _), n in counts.items() if collection == "skills")
+
+
+@pytest.mark.parametrize("path,user", [("/requests/sent", "alice"), ("/requests/received", "bob")])
+def test_request_lists_batch_skill_titles(counts, path, user):
+    seed(60, "pending")
+    per_page = {}
+    for limit in (5, 50):
+        counts.clear()
+        page = get(f"{path}?limit={limit}", user)
+        assert len(page) == limit and all(r["skill_title"].startswith("Skill ") for r in page)
+        per_page[limit] = (skill_queries(counts), sum(counts.values()))
+    assert per_page[5] == per_page[50] == (1, 2)  # one page query, one $in for every title
+
+
+def test_chat_connections_single_round_trip(counts):
+    per_size = {}
+    for size in (5, 60):
+        seed(size, "accepted")
+        counts.clear()
+        connections = get("/chats/connections", "alice")
+        assert len(connections) == size and all(c["skill_title"].startswith("Skill ") for c in connections)
+        per_size[size] = (skill_queries(counts), sum(counts.values()))
+    assert per_size[5] == per_size[60] == (0, 1)  # titles come from a $lookup in the one aggregation
@@ -0,0 +1,36 @@
+"""Cached token verification never outlives a token's exp and stays within its size bound."""
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+import auth
+from auth import TokenCache, create_access_token
+
+
+def test_expired_entries_are_misses_and_evicted():
+    cache = TokenCache()
+    cache.put("live", "alice", time.time() + 60); cache.put("stale", "bob", time.time() - 1)
+    assert cache.get("live") == "alice" and cache.get("stale") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache, exp = TokenCache(maxsize=2), time.time() + 60
+    cache.put("a", "alice", exp); cache.put("b", "bob", exp)
+    assert cache.get("a") == "alice"  # a is now the most recent
+    cache.put("c", "carol", exp)
+    assert cache.get("b") is None and cache.get("a") == "alice" and cache.get("c") == "carol"
+    assert cache.stats()["size"] == 2
+
+
+def test_verify_token_stops_serving_a_cached_token_once_it_expires(monkeypatch):
+    monkeypatch.setattr(auth, "token_cache", TokenCache())
+    token = create_access_token({"sub": "alice"}, timedelta(seconds=1))
+    assert asyncio.run(auth.verify_token(token)) == "alice" and asyncio.run(auth.verify_token(token)) == "alice"
+    assert auth.token_cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+    time.sleep(2)  # exp is stored in whole seconds
+    with pytest.raises(HTTPException) as raised: asyncio.run(auth.verify_token(token))
+    assert raised.value.status_code == 401 and auth.token_cache.stats()["size"] == 0
@@ -0,0 +1,73 @@
+"""Personal messages and notifications reach every socket of the user, whichever worker holds it."""
+import asyncio
+import time
+
+import backplane
+from backplane import UnixSocketBackplane
+from connections import ConnectionManager
+from serialization import loads
+
+
+class FakeWebSocket:
+    def __init__(self): self.frames = []
+    async def accept(self): pass
+    async def send_text(self, text: str): self.frames.append(loads(text))
+    async def close(self, code: int = 1000): pass
+
+
+async def eventually(check, timeout: float = 3.0):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def contents(ws: FakeWebSocket) -> list: return [frame.get("content") for frame in ws.frames]
+
+
+def test_personal_messages_reach_sockets_on_every_worker(tmp_path):
+    async def run():
+        path = str(tmp_path / "ws.sock")
+        a, b, c = (ConnectionManager(UnixSocketBackplane(path)) for _ in range(3))
+        await a.start(); await eventually(lambda: a.backplane.is_broker)
+        await b.start(); await c.start()
+        alice_a, alice_b = FakeWebSocket(), FakeWebSocket()
+        await a.connect(alice_a, "alice"); await b.connect(alice_b, "alice")
+        await eventually(lambda: all(m.backplane.is_remote("alice") for m in (a, b, c)))
+        try:
+            assert await a.send_personal_message({"content": "from a"}, "alice")
+            assert await c.send_personal_message({"content": "from c"}, "alice")
+            outcomes = []
+            await a.notify({"content": "notified"}, "alice", outcomes.append)
+            await eventually(lambda: all(len(ws.frames) == 3 for ws in (alice_a, alice_b)))
+            assert sorted(contents(alice_a)) == sorted(contents(alice_b)) == ["from a", "from c", "notified"]
+            assert outcomes == [True]  # reported once, although two workers delivered it
+            assert not await c.send_personal_message({"content": "nobody"}, "bob")
+        finally:
+            for m in (c, b, a): await m.stop()
+    asyncio.run(run())
+
+
+def test_a_peer_that_stops_reading_is_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(backplane, "WS_BACKPLANE_MAX_BUFFER", 2 ** 16)
+    async def run():
+        path = str(tmp_path / "ws.sock")
+        broker, follower = UnixSocketBackplane(path), UnixSocketBackplane(path)
+        async def deliver(frame): pass
+        await broker.start(deliver, list); await eventually(lambda: broker.is_broker)
+        _, stuck = await asyncio.open_unix_connection(path)  # connected, never reads
+        await follower.start(deliver, list)
+        await eventually(lambda: len(broker._peers) == 2 and follower._upstream is not None)
+        upstream = follower._upstream
+        try:
+            for _ in range(500):
+                broker.publish({"op": "personal", "client_id": "alice", "data": {"content": "x" * 4096}})
+                await asyncio.sleep(0)
+            await eventually(lambda: len(broker._peers) == 1)
+            assert follower._upstream is upstream  # the follower kept up and kept its connection
+            broker.join("alice")
+            await eventually(lambda: follower.is_remote("alice"))
+        finally:
+            stuck.close()
+            for b in (follower, broker): await b.stop()
+    asyncio.run(run())
@@ -1,8 +1,8 @@
 // The base URL of your FastAPI backend
 const API_URL = "https://skill-swap-production-7ffa.up.railway.app";
 
-// A helper function to handle API requests and errors
-async function apiRequest(endpoint, method = 'GET', body = null) {
+// Sends the request and throws on an error status; returns the raw response
+async function apiFetch(endpoint, method = 'GET', body = null) {
   const token = localStorage.getItem("token");
   const headers = {
     'Content-Type': 'application/json',
@@ -37,6 +37,13 @@ async function apiRequest(endpoint, method = 'GET', body = null) {
     throw new Error(errorMessage);
   }
 
+  return response;
+}
+
+// A helper function to handle API requests and errors
+async function apiRequest(endpoint, method = 'GET', body = null) {
+  const response = await apiFetch(endpoint, method, body);
+
   if (response.status === 204) {
     return null;
   }
@@ -44,6 +51,13 @@ async function apiRequest(endpoint, method = 'GET', body = null) {
   return response.json();
 }
 
+// Paginated list routes: one page plus the cursor for the next (null on the last page)
+async function apiPage(endpoint, cursor = null) {
+  const separator = endpoint.includes('?') ? '&' : '?';
+  const response = await apiFetch(cursor ? `${endpoint}${separator}cursor=${encodeURIComponent(cursor)}` : endpoint);
+  return { items: await response.json(), nextCursor: response.headers.get('X-Next-Cursor') };
+}
+
 // --- API Functions ---
 
 export function getSummary() {
@@ -52,6 +66,11 @@ export function getSummary() {
 export function getMarketSkills() {
   return apiRequest('/skills/market');
 }
+export function searchSkills(query, category = null) {
+  const params = new URLSearchParams({ q: query });
+  if (category) params.set('category', category);
+  return apiRequest(`/skills/search?${params}`);
+}
 export function getMySkills() {
     return apiRequest('/skills/mine');
 }
@@ -67,25 +86,41 @@ export function requestExchange(skillId, message) {
 export function respondToRequest(requestId, action) {
   return apiRequest(`/requests/${requestId}/respond`, 'PUT', { action });
 }
-export function getSentRequests() {
-  return apiRequest('/requests/sent');
+// The list getters below return { items, nextCursor }; pass nextCursor back to fetch the next (older) page
+export function getSentRequests(cursor) {
+  return apiPage('/requests/sent', cursor);
 }
 
-export function getIncomingRequests() {
-  return apiRequest('/requests/received');
+export function getIncomingRequests(cursor) {
+  return apiPage('/requests/received', cursor);
 }
 
-export function getNotifications() {
-  return apiRequest('/notifications');
+export function getNotifications(cursor) {
+  return apiPage('/notifications', cursor);
 }
 
 export function markNotificationRead(notifId) {
   return apiRequest(`/notifications/${notifId}/read`, 'PUT');
 }
 
+// Marks the given notification ids read, or every unread one when ids is omitted
+export function markNotificationsRead(ids) {
+  return apiRequest('/notifications/read', 'PUT', ids ? { ids } : {});
+}
+
+export function getUnreadCount() {
+  return apiRequest('/notifications/unread_count');
+}
+
 // ✅ THIS FUNCTION WAS MISSING
-export function getChatHistory(requestId) {
-  return apiRequest(`/chat/${requestId}`);
+// Newest page of a chat, oldest message first; pass nextCursor to load the page of older messages before it
+export function getChatHistory(requestId, cursor) {
+  return apiPage(`/chat/${requestId}`, cursor);
+}
+
+// Only the messages newer than `after` (the last message id, or an ISO timestamp)
+export function getChatUpdates(requestId, after) {
+  return apiRequest(`/chat/${requestId}?after=${encodeURIComponent(after)}`);
 }
 
 export function getChatConnections() {
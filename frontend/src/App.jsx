@@ -50,11 +50,22 @@ export default function App() {
           socket.onmessage = (event) => {
               try {
                   const message = JSON.parse(event.data);
+                  // Server heartbeat: answer so the socket is not reaped as idle
+                  if (message.type === 'ping') {
+                      socket.send(JSON.stringify({ type: 'pong' }));
+                      return;
+                  }
                   console.log("App.jsx received message:", message); // Debug log
                   if (message.type === 'new_skill') {
                       setLatestSkill(message.data);
                   } else if (message.type === 'new_request' || message.type === 'request_response') {
                       setNotifications(prev => [message, ...prev]);
+                  } else if (message.type === 'notification_batch') {
+                      // Missed notifications replayed on connect, or a burst coalesced by the server; oldest first
+                      setNotifications(prev => [...message.notifications.slice().reverse(), ...prev]);
+                  } else if (message.type === 'error') {
+                      // A frame the server refused (e.g. a chat message it cannot store)
+                      console.error("WebSocket error from server:", message.detail);
                   }
               } catch (e) {
                   console.error("Failed to parse WebSocket message:", e);
@@ -1,91 +1,108 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
 import { Link } from 'react-router-dom';
 import { FaHome, FaBook, FaUser, FaCog, FaSignOutAlt, FaTasks, FaBell, FaCommentDots } from "react-icons/fa";
 import { Sun, Moon } from "lucide-react";
-import { respondToRequest, getSentRequests, getIncomingRequests, getNotifications, markNotificationRead } from '../../services/api';
+import { respondToRequest, getSentRequests, getIncomingRequests, getNotifications, markNotificationRead, markNotificationsRead } from '../../services/api';
 import './Notifications.css';
 
 export default function Notifications({ darkMode, setDarkMode, notifications, setNotifications }) {
   const [acceptedRequests, setAcceptedRequests] = useState({});
   const [sentRequests, setSentRequests] = useState([]);
 
-  // Fetch sent requests on initial load
-  useEffect(() => {
-    const fetchSent = async () => {
-      try {
-        const data = await getSentRequests();
-        setSentRequests(data);
-      } catch (err) {
-        console.error("Failed to fetch sent requests:", err);
-      }
-    };
-    fetchSent();
-  }, []); // Empty array ensures this runs only once on mount
+  // Next-page cursors (null once the last page is loaded); lists are paged on the server, newest first
+  const [sentCursor, setSentCursor] = useState(null);
+  const [incomingCursor, setIncomingCursor] = useState(null);
+  const [notifCursor, setNotifCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
-  // Fetch incoming requests from backend on mount to cover missed websocket notifications
-  useEffect(() => {
-    const fetchIncoming = async () => {
-      try {
-        const incoming = await getIncomingRequests();
-        if (incoming && incoming.length > 0) {
-          // Convert DB request docs into notification objects used by websocket
-          const notifObjs = incoming.map(r => ({
-            type: 'new_request',
-            request_id: r._id,
-            from_user: r.from_user,
-            to_user: r.to_user,
-            skill_title: r.skill_title || r.skill_id,
-            skill_id: r.skill_id,
-            message: r.message || ''
-          }));
-          // Merge with existing notifications, avoiding duplicates by request_id
-          setNotifications(prev => {
-            const existingIds = new Set(prev.map(n => n.request_id));
-            const merged = [...prev];
-            notifObjs.forEach(n => { if (!existingIds.has(n.request_id)) merged.push(n); });
-            return merged;
-          });
-        }
-      } catch (err) {
-        console.error('Failed to fetch incoming requests:', err);
+  const loadSent = useCallback(async (cursor) => {
+    try {
+      const { items, nextCursor } = await getSentRequests(cursor);
+      setSentRequests(prev => (cursor ? [...prev, ...items] : items));
+      setSentCursor(nextCursor);
+    } catch (err) {
+      console.error("Failed to fetch sent requests:", err);
+    }
+  }, []);
+
+  // Incoming requests cover missed websocket notifications
+  const loadIncoming = useCallback(async (cursor) => {
+    try {
+      const { items: incoming, nextCursor } = await getIncomingRequests(cursor);
+      setIncomingCursor(nextCursor);
+      if (incoming && incoming.length > 0) {
+        // Convert DB request docs into notification objects used by websocket
+        const notifObjs = incoming.map(r => ({
+          type: 'new_request',
+          request_id: r._id,
+          from_user: r.from_user,
+          to_user: r.to_user,
+          skill_title: r.skill_title || r.skill_id,
+          skill_id: r.skill_id,
+          message: r.message || ''
+        }));
+        // Merge with existing notifications, avoiding duplicates by request_id
+        setNotifications(prev => {
+          const existingIds = new Set(prev.map(n => n.request_id));
+          const merged = [...prev];
+          notifObjs.forEach(n => { if (!existingIds.has(n.request_id)) merged.push(n); });
+          return merged;
+        });
       }
-    };
-    fetchIncoming();
+    } catch (err) {
+      console.error('Failed to fetch incoming requests:', err);
+    }
   }, [setNotifications]);
 
-  // Fetch persisted notifications (history/unread) and merge into notifications state
-  useEffect(() => {
-    const fetchNotifs = async () => {
-      try {
-        const notifs = await getNotifications();
-        if (notifs && notifs.length > 0) {
-          // Convert DB notifications to client format and merge
-          const mapped = notifs.map(n => ({
-            type: n.type,
-            request_id: n.request_id || (n.request_id === undefined ? n.request_id : null),
-            notification_id: n._id,
-            from_user: n.from_user,
-            to_user: n.to_user,
-            skill_title: n.skill_title,
-            skill_id: n.skill_id,
-            message: n.message || '',
-            delivered: !!n.delivered,
-            read: !!n.read
-          }));
-          setNotifications(prev => {
-            const existingNotifIds = new Set(prev.map(p => p.notification_id || p.request_id));
-            const merged = [...prev];
-            mapped.forEach(m => { if (!existingNotifIds.has(m.notification_id || m.request_id)) merged.push(m); });
-            return merged;
-          });
-        }
-      } catch (err) {
-        console.error('Failed to fetch notifications:', err);
+  // Persisted notifications (history/unread), merged into notifications state
+  const loadNotifs = useCallback(async (cursor) => {
+    try {
+      const { items: notifs, nextCursor } = await getNotifications(cursor);
+      setNotifCursor(nextCursor);
+      if (notifs && notifs.length > 0) {
+        // Convert DB notifications to client format and merge
+        const mapped = notifs.map(n => ({
+          type: n.type,
+          request_id: n.request_id || (n.request_id === undefined ? n.request_id : null),
+          notification_id: n._id,
+          from_user: n.from_user,
+          to_user: n.to_user,
+          skill_title: n.skill_title,
+          skill_id: n.skill_id,
+          message: n.message || '',
+          delivered: !!n.delivered,
+          read: !!n.read
+        }));
+        setNotifications(prev => {
+          const existingNotifIds = new Set(prev.map(p => p.notification_id || p.request_id));
+          const merged = [...prev];
+          mapped.forEach(m => { if (!existingNotifIds.has(m.notification_id || m.request_id)) merged.push(m); });
+          return merged;
+        });
       }
-    };
-    fetchNotifs();
+    } catch (err) {
+      console.error('Failed to fetch notifications:', err);
+    }
   }, [setNotifications]);
 
+  // First page of each list on mount
+  useEffect(() => { loadSent(); }, [loadSent]);
+  useEffect(() => { loadIncoming(); }, [loadIncoming]);
+  useEffect(() => { loadNotifs(); }, [loadNotifs]);
+
+  // Next page of whichever incoming lists still have one
+  const loadMoreIncoming = async () => {
+    setLoadingMore(true);
+    await Promise.all([incomingCursor && loadIncoming(incomingCursor), notifCursor && loadNotifs(notifCursor)]);
+    setLoadingMore(false);
+  };
+
+  const loadMoreSent = async () => {
+    setLoadingMore(true);
+    await loadSent(sentCursor);
+    setLoadingMore(false);
+  };
+
   // Update sent requests list based on incoming response notifications
   useEffect(() => {
     const responseNotif = notifications.find(n => n.type === 'request_response');
@@ -168,7 +185,17 @@ export default function Notifications({ darkMode, setDarkMode, notifications, se
       {/* --- End Sidebar --- */}
 
       <main className="notifications-main">
-        <div className="notifications-header"><h1>Notifications</h1></div>
+        <div className="notifications-header">
+          <h1>Notifications</h1>
+          {notifications.some(n => n.notification_id && !n.read) && (
+            <button className="clear-btn" onClick={async () => {
+              try {
+                await markNotificationsRead();
+                setNotifications(prev => prev.map(n => (n.notification_id ? { ...n, read: true } : n)));
+              } catch (e) { console.error('Mark all read failed', e); }
+            }}>Mark all read</button>
+          )}
+        </div>
 
         {/* --- Incoming Requests Section --- */}
         <section className="notification-section">
@@ -218,6 +245,9 @@ export default function Notifications({ darkMode, setDarkMode, notifications, se
               })
             ) : ( <p className="no-notifications">No new incoming requests.</p> )}
           </div>
+          {(incomingCursor || notifCursor) && (
+            <button className="clear-btn load-more-btn" onClick={loadMoreIncoming} disabled={loadingMore}>{loadingMore ? 'Loading...' : 'Load more'}</button>
+          )}
         </section>
         {/* --- End Incoming Requests Section --- */}
 
@@ -234,6 +264,9 @@ export default function Notifications({ darkMode, setDarkMode, notifications, se
               ))
             ) : ( <p className="no-notifications">You haven't sent any requests yet.</p> )}
           </div>
+          {sentCursor && (
+            <button className="clear-btn load-more-btn" onClick={loadMoreSent} disabled={loadingMore}>{loadingMore ? 'Loading...' : 'Load more'}</button>
+          )}
         </section>
         {/* --- End Sent Requests Section --- */}
       </main>
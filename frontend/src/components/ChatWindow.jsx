@@ -9,7 +9,10 @@ export default function ChatWindow({ requestId, otherUser, onClose, socketRef })
     const [newMessage, setNewMessage] = useState("");
     const [currentUser, setCurrentUser] = useState("");
     const [isLoadingHistory, setIsLoadingHistory] = useState(true);
+    const [olderCursor, setOlderCursor] = useState(null); // Cursor for the page before the oldest loaded message
+    const [isLoadingOlder, setIsLoadingOlder] = useState(false);
     const messagesEndRef = useRef(null); // Ref to auto-scroll to the bottom
+    const keepScrollRef = useRef(false); // Set while prepending older messages so the view does not jump to the bottom
 
     // Get current user's name from token
     useEffect(() => {
@@ -31,8 +34,9 @@ export default function ChatWindow({ requestId, otherUser, onClose, socketRef })
         const fetchHistory = async () => {
             setIsLoadingHistory(true);
             try {
-                const history = await getChatHistory(requestId);
-                setMessages(history);
+                const { items, nextCursor } = await getChatHistory(requestId);
+                setMessages(items);
+                setOlderCursor(nextCursor);
             } catch (error) {
                 console.error("Failed to fetch chat history:", error);
             } finally {
@@ -77,9 +81,29 @@ export default function ChatWindow({ requestId, otherUser, onClose, socketRef })
 
     // Auto-scroll to the bottom when new messages arrive
     useEffect(() => {
+        if (keepScrollRef.current) {
+            keepScrollRef.current = false;
+            return;
+        }
         messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
     }, [messages]);
 
+    // History is paged (newest first on the server); fetch the page before the oldest loaded message
+    const loadOlderMessages = async () => {
+        if (!olderCursor || isLoadingOlder) return;
+        setIsLoadingOlder(true);
+        try {
+            const { items, nextCursor } = await getChatHistory(requestId, olderCursor);
+            keepScrollRef.current = true;
+            setMessages(prev => [...items, ...prev]);
+            setOlderCursor(nextCursor);
+        } catch (error) {
+            console.error("Failed to fetch older messages:", error);
+        } finally {
+            setIsLoadingOlder(false);
+        }
+    };
+
     // Handle sending a new message
     const handleSendMessage = (e) => {
         e.preventDefault();
@@ -127,11 +151,18 @@ export default function ChatWindow({ requestId, otherUser, onClose, socketRef })
                 {isLoadingHistory ? (
                     <p>Loading history...</p>
                 ) : (
-                    messages.map((msg, index) => (
+                    <>
+                    {olderCursor && (
+                        <button type="button" className="load-older-btn" onClick={loadOlderMessages} disabled={isLoadingOlder}>
+                            {isLoadingOlder ? "Loading..." : "Load older messages"}
+                        </button>
+                    )}
+                    {messages.map((msg, index) => (
                         <div key={msg._id || index} className={`message-bubble ${msg.from_user === currentUser ? 'sent' : 'received'}`}>
                             {msg.content}
                         </div>
-                    ))
+                    ))}
+                    </>
                 )}
                 <div ref={messagesEndRef} /> {/* Element to scroll to */}
             </div>